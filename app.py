@@ -1,9 +1,29 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import numpy as np
+import os
+
+from nutrichoice.aggregate_index import AggregateIndex
+from nutrichoice.analysis import analyze
+from nutrichoice.autocomplete import PrefixIndex
+from nutrichoice.bitmap import BitmapIndex
+from nutrichoice.bm25 import BM25Index
+from nutrichoice.filters import RangeIndex, Selection
+from nutrichoice.fuzzy import FuzzyIndex
+from nutrichoice.planner import Statistics
+from nutrichoice.presets import DIET_PRESETS
+from nutrichoice.query import Catalog
+from nutrichoice.refine import SearchRefiner
+from nutrichoice.registry import GROUP_COLUMN, catalog_stats, discover, load_catalog, signatures
+from nutrichoice.result_cache import ResultCache, normalize_term
+from nutrichoice.schema import NUTRIENT_COLUMNS
+from nutrichoice.signature import forget
+from nutrichoice.sqlite_backend import SQLiteBackend
+from nutrichoice.tokens import TokenIndex
+from nutrichoice.trigram import TrigramIndex
+from nutrichoice.zone_index import ZoneIndex
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -267,23 +287,157 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- Data Loading ---
-DATA_FILE = 'FOOD-DATA-GROUP1_cleaned.csv'
+# Every FOOD-DATA-GROUP<n>_cleaned.csv (or .columns store) in this directory
+DATA_DIR = '.'
+# Filtering backend: 'pandas' (in-memory masks) or 'sqlite' (indexed queries)
+QUERY_BACKEND = os.environ.get('NUTRICHOICE_BACKEND', 'pandas')
+SQLITE_FILE = os.path.join(DATA_DIR, 'FOOD-DATA.sqlite')
+# Memory budget of the shared cache of computed results, in megabytes
+RESULT_CACHE_MB = float(os.environ.get('NUTRICHOICE_RESULT_CACHE_MB', 64))
+# Search box match modes and the query search mode each one runs
+SEARCH_MODES = {
+    "Substring": 'substring',
+    "Ranked": 'ranked',
+    "Fuzzy": 'fuzzy',
+    "Regular expression": 'regex',
+}
+# Which differences in a search term cannot change its results, per match mode
+TERM_NORMALIZATION = {
+    "Substring": dict(fold_case=True, fold_space=False),
+    "Ranked": dict(fold_case=False, fold_space=True),
+    "Fuzzy": dict(fold_case=True, fold_space=True),
+    "Regular expression": dict(fold_case=False, fold_space=False),
+}
+
+def data_signature(groups):
+    """Content signatures of the group files; every dataset cache is keyed on them."""
+    try:
+        return signatures(groups)
+    except FileNotFoundError:
+        return None
+
+@st.cache_resource(max_entries=2)
+def load_data(groups, signature):
+    """Loads all food groups as one frame shared by every session.
 
-@st.cache_data
-def load_data(file_path):
-    """Loads the cleaned food data from a CSV file."""
+    The nutrient columns are read-only memory maps over the column stores, so
+    sessions and worker processes share the same pages instead of each holding
+    a private copy of the dataset. ``signature`` only keys the cache: a changed
+    file gets a new entry, an unchanged one keeps hitting the old entry.
+    """
     try:
-        df = pd.read_csv(file_path)
+        df = load_catalog(groups)
         return df
-    except FileNotFoundError:
-        st.error(f"Error: The file {file_path} was not found.")
+    except FileNotFoundError as e:
+        st.error(f"Error: The file {e.filename} was not found.")
         st.stop()
     except Exception as e:
         st.error(f"Error loading data: {e}")
         st.stop()
 
+@st.cache_resource(max_entries=2)
+def load_column_stats(signature, _groups, _df):
+    """Column statistics saved with every group's store, merged for the whole catalogue.
+
+    Slider bounds and quick stats come from here, never from a pass over the rows.
+    """
+    return catalog_stats(_groups, names=_df['food'].cat.categories)
+
+@st.cache_resource(max_entries=2)
+def load_backend(signature, _df):
+    """Opens the SQLite copy of the dataset, rebuilding it when the data changes."""
+    return SQLiteBackend.open(_df, SQLITE_FILE, signature=signature)
+
+@st.cache_resource(max_entries=2)
+def load_range_index(signature, _df):
+    """Sorted nutrient orders for the range sliders, shared by every session."""
+    return RangeIndex(_df)
+
+@st.cache_resource(max_entries=2)
+def load_aggregate_index(signature, _df):
+    """Prefix sums over the sorted nutrient orders, for KPIs of a single range filter."""
+    return AggregateIndex(load_range_index(signature, _df))
+
+@st.cache_resource(max_entries=2)
+def load_bitmap_index(signature, _df):
+    """Packed bitmaps per food group, diet preset and nutrient bucket."""
+    categorical = [GROUP_COLUMN] if GROUP_COLUMN in _df.columns else []
+    return BitmapIndex(_df, range_index=load_range_index(signature, _df), categorical=categorical)
+
+@st.cache_resource(max_entries=2)
+def load_zone_index(signature, _df):
+    """k-d zone index over every nutrient for multi-nutrient range queries."""
+    return ZoneIndex(_df)
+
+@st.cache_resource(max_entries=2)
+def load_statistics(signature, _column_stats):
+    """Equi-depth histograms per nutrient, used by the planner to estimate filter selectivity."""
+    return Statistics.from_table_stats(_column_stats)
+
+@st.cache_resource(max_entries=2)
+def load_name_index(signature, _df):
+    """Trigram index over the distinct food names for the search box."""
+    return TrigramIndex(_df['food'].cat.categories)
+
+@st.cache_resource(max_entries=2)
+def load_token_index(signature, _df):
+    """Word postings over the distinct food names."""
+    return TokenIndex(_df['food'].cat.categories)
+
+@st.cache_resource(max_entries=2)
+def load_fuzzy_index(signature, _df):
+    """Symmetric-delete index over the food name vocabulary for typo-tolerant search."""
+    return FuzzyIndex(load_token_index(signature, _df))
+
+@st.cache_resource(max_entries=2)
+def load_prefix_index(signature, _df):
+    """Word-prefix index over the food names, ranked by how many rows share a name."""
+    codes = _df['food'].cat.codes.to_numpy()
+    popularity = np.bincount(codes[codes >= 0], minlength=len(_df['food'].cat.categories))
+    return PrefixIndex(_df['food'].cat.categories, popularity)
+
+@st.cache_resource(max_entries=2)
+def load_term_index(signature, _df):
+    """Word postings keyed by stemmed, synonym-mapped terms ("potatoes" -> "potato")."""
+    return TokenIndex(_df['food'].cat.categories, analyze=analyze)
+
+@st.cache_resource(max_entries=2)
+def load_bm25_index(signature, _df):
+    """BM25 statistics over the food name terms for ranked boolean search."""
+    return BM25Index(load_term_index(signature, _df))
+
+@st.cache_resource
+def load_result_cache():
+    """LRU cache of filtered rows, KPIs and chart inputs shared by every session."""
+    return ResultCache(max_bytes=int(RESULT_CACHE_MB * 1024 * 1024))
+
+def use_completion():
+    """Copies a picked suggestion into the search box."""
+    if st.session_state.search_completion:
+        st.session_state.search_term = st.session_state.search_completion
+    st.session_state.search_completion = None
+
 # Load the data
-df = load_data(DATA_FILE)
+data_groups = discover(DATA_DIR)
+if not data_groups:
+    st.error(f"Error: No FOOD-DATA-GROUP data files were found in {os.path.abspath(DATA_DIR)}.")
+    st.stop()
+signature = data_signature(data_groups)
+df = load_data(data_groups, signature)
+column_stats = load_column_stats(signature, data_groups, df) if not df.empty else None
+# Queries push their predicates into the shared, cached indexes
+catalog = Catalog(df, signature=signature, indexes={
+    'stats': lambda: load_statistics(signature, column_stats),
+    'range': lambda: load_range_index(signature, df),
+    'aggregates': lambda: load_aggregate_index(signature, df),
+    'bitmap': lambda: load_bitmap_index(signature, df),
+    'zone': lambda: load_zone_index(signature, df),
+    'names': lambda: load_name_index(signature, df),
+    'terms': lambda: load_term_index(signature, df),
+    'ranked': lambda: load_bm25_index(signature, df),
+    'fuzzy': lambda: load_fuzzy_index(signature, df),
+    'backend': lambda: load_backend(signature, df) if QUERY_BACKEND == 'sqlite' and not df.empty else None,
+})
 
 # --- Sidebar Filters ---
 with st.sidebar:
@@ -291,23 +445,42 @@ with st.sidebar:
     
     # Refresh button
     if st.button("🔄 Refresh Dashboard", use_container_width=True):
-        st.cache_data.clear()
+        # Re-hash the data files; caches are only rebuilt if their content changed.
+        for path in data_groups.values():
+            forget(path)
         st.rerun()
     
     st.markdown("<br>", unsafe_allow_html=True)
     
+    # Group filter (only worth showing once there is more than one group)
+    selected_groups = list(data_groups)
+    if len(data_groups) > 1:
+        st.markdown("### 🗂️ Food Groups")
+        selected_groups = st.multiselect("Select food groups:", list(data_groups), default=list(data_groups))
+
     # Search functionality
     st.markdown("### 🔍 Search Food")
-    search_term = st.text_input("Enter food name:", placeholder="e.g., chicken, apple...")
+    search_term = st.text_input("Enter food name:", placeholder="e.g., chicken, apple...", key="search_term")
+    # Completions are answered by the prefix index alone, without touching the rows
+    if search_term and not df.empty:
+        completions = [name for name in load_prefix_index(signature, df).complete(search_term, limit=5)
+                       if name.lower() != search_term.strip().lower()]
+        if completions:
+            st.pills("Suggestions:", completions, key="search_completion", on_change=use_completion)
+    search_mode = st.radio(
+        "Match:", list(SEARCH_MODES), horizontal=True,
+        help="Ranked takes words with AND/OR/NOT and \"quoted phrases\", best matches first; "
+             "Fuzzy tolerates typos such as 'chiken'; regular expressions look like chick(en|pea)"
+    )
+    suggestion_slot = st.empty()
     
     # Calorie filter
     st.markdown("### 🔥 Calorie Range")
     if not df.empty:
         cal_min, cal_max = st.slider(
             "Select calorie range:",
-            int(df['Caloric Value'].min()),
-            int(df['Caloric Value'].max()),
-            (int(df['Caloric Value'].min()), int(df['Caloric Value'].max()))
+            int(column_stats['Caloric Value'].min), int(column_stats['Caloric Value'].max),
+            (int(column_stats['Caloric Value'].min), int(column_stats['Caloric Value'].max))
         )
     
     # Protein filter
@@ -315,11 +488,37 @@ with st.sidebar:
     if not df.empty:
         protein_min, protein_max = st.slider(
             "Select protein range (g):",
-            float(df['Protein'].min()),
-            float(df['Protein'].max()),
-            (float(df['Protein'].min()), float(df['Protein'].max()))
+            column_stats['Protein'].min, column_stats['Protein'].max,
+            (column_stats['Protein'].min, column_stats['Protein'].max)
         )
     
+    # Range filters on any other nutrient the user adds
+    extra_ranges = {}
+    st.markdown("### 🧪 More Nutrients")
+    if not df.empty:
+        extra_nutrients = st.multiselect(
+            "Add nutrient filters:",
+            [col for col in NUTRIENT_COLUMNS if col not in ('Caloric Value', 'Protein')]
+        )
+        for col in extra_nutrients:
+            low, high = column_stats[col].min, column_stats[col].max
+            if low is not None and low < high:
+                extra_ranges[col] = st.slider(f"{col}:", low, high, (low, high), key=f"range_{col}")
+    
+    # Diet presets (every chosen preset must hold)
+    st.markdown("### 🥦 Diet Presets")
+    selected_presets = st.multiselect("Only show foods that are:", list(DIET_PRESETS))
+    
+    # Free-form conditions over any nutrient columns
+    st.markdown("### 🧮 Custom Filter")
+    filter_expression = ' '.join(st.text_input(
+        "Filter expression:",
+        placeholder="Protein > 20 and Sugars / Carbohydrates < 0.2",
+        help="Compare nutrient columns with < <= > >= == !=, combine them with and, or, not "
+             "and parentheses, and use + - * / between columns and numbers. "
+             "Wrap a name in [brackets] if it is ambiguous."
+    ).split())
+    
     # Visualization options
     st.markdown("### 📊 Visualization Options")
     show_top_n = st.slider("Show top N foods:", 5, 20, 10)
@@ -331,20 +530,101 @@ with st.sidebar:
     # Stats
     st.markdown("### 📈 Quick Stats")
     if not df.empty:
-        st.info(f"**Total Records:** {len(df)}")
-        st.info(f"**Unique Foods:** {df['food'].nunique()}")
+        st.info(f"**Total Records:** {column_stats.rows}")
+        st.info(f"**Unique Foods:** {column_stats['food'].distinct}")
+        matching_slot = st.empty()
 
-# Apply filters
-filtered_df = df.copy()
-if search_term:
-    filtered_df = filtered_df[filtered_df['food'].str.contains(search_term, case=False, na=False)]
+# The whole sidebar state as one lazy query; nothing runs until it executes
+query = catalog.query()
+if not df.empty:
+    query = query.filter(
+        {'Caloric Value': (cal_min, cal_max), 'Protein': (protein_min, protein_max), **extra_ranges},
+        groups=selected_groups if len(selected_groups) < len(data_groups) else None,
+        presets=selected_presets,
+        expression=filter_expression
+    ).search(search_term, SEARCH_MODES[search_mode], lead=show_top_n)
+
+# Every output below is determined by the sidebar state, so finished results
+# are cached across sessions under a normalized key of that state
+result_cache = load_result_cache()
+results = None
 if not df.empty:
-    filtered_df = filtered_df[
-        (filtered_df['Caloric Value'] >= cal_min) & 
-        (filtered_df['Caloric Value'] <= cal_max) &
-        (filtered_df['Protein'] >= protein_min) & 
-        (filtered_df['Protein'] <= protein_max)
-    ]
+    result_key = (
+        QUERY_BACKEND, query.filter_key(),
+        (search_mode, normalize_term(search_term, **TERM_NORMALIZATION[search_mode])) if search_term else None,
+        show_top_n,
+    )
+    results = result_cache.get(result_key)
+
+if results is not None:
+    selection = Selection(df, results['rows'])
+else:
+    # Filters are pushed into the indexes and yield row positions into the
+    # shared frame; the KPIs and chart inputs then share one gather per column.
+    # While a substring search only grows ("chi" -> "chic") under the same
+    # filters, the session's refiner narrows its previous result instead.
+    result = query.top_k(
+        'Protein', show_top_n
+    ).top_k(
+        'Carbohydrates', show_top_n
+    ).top_k(
+        'Fat', show_top_n
+    ).top_k(
+        'Caloric Value', 5, columns=['food', 'Protein', 'Fat', 'Carbohydrates', 'Caloric Value']
+    ).agg(
+        avg_calories=('Caloric Value', 'mean'),
+        avg_protein=('Protein', 'mean'),
+        avg_fat=('Fat', 'mean'),
+        avg_carbs=('Carbohydrates', 'mean'),
+        total_foods=('food', 'nunique'),
+        total_protein=('Protein', 'sum'),
+        total_fat=('Fat', 'sum'),
+        total_carbs=('Carbohydrates', 'sum'),
+        max_protein=('Protein', 'max'),
+        max_fat=('Fat', 'max'),
+        max_carbs=('Carbohydrates', 'max'),
+    ).execute(refiner=st.session_state.setdefault('search_refiner', SearchRefiner()))
+    selection, aggregates = result.selection, result.aggregates
+    suggestion = None
+    if search_term and not df.empty:
+        if search_mode == "Fuzzy" or selection.empty:
+            suggestion = load_fuzzy_index(signature, df).suggest(search_term)
+
+    # KPIs and the small chart inputs are computed once per filter state
+    kpi_names = ['avg_calories', 'avg_protein', 'avg_fat', 'avg_carbs', 'total_foods']
+    results = {
+        'rows': selection.rows,
+        'records': result.count,
+        'warnings': result.warnings,
+        'plan': result.plan.explain(),
+        'suggestion': suggestion,
+        'kpis': {name: aggregates[name] for name in kpi_names} if not selection.empty else dict.fromkeys(kpi_names, 0),
+        'top_protein': result.top['Protein'].sort_values('Protein', ascending=True),
+        'top_carbs': result.top['Carbohydrates'].sort_values('Carbohydrates', ascending=True),
+        'top_fat': result.top['Fat'].sort_values('Fat', ascending=True),
+        'macro_totals': {
+            'Protein': aggregates['total_protein'],
+            'Fat': aggregates['total_fat'],
+            'Carbohydrates': aggregates['total_carbs']
+        },
+        'top_5_foods': result.top['Caloric Value'],
+        'radar_max': max(aggregates['max_protein'], aggregates['max_fat'], aggregates['max_carbs']),
+    }
+    if not df.empty:
+        result_cache.put(result_key, results)
+
+if not df.empty:
+    matching_slot.info(f"**Matching Records:** {results['records']}")
+for warning in results['warnings']:
+    st.sidebar.warning(warning)
+if not df.empty:
+    with st.sidebar.expander("🧭 Query Plan"):
+        st.code(results['plan'], language=None)
+if results['suggestion']:
+    suggestion_slot.markdown(f"Did you mean **{results['suggestion']}**?")
+cache_stats = result_cache.stats()
+st.sidebar.caption(f"Result cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                   f"{cache_stats['entries']} entries ({cache_stats['bytes'] / 2**20:.1f} MB)")
 
 # --- Dashboard Header ---
 st.markdown("""
@@ -355,16 +635,11 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- KPI Metrics Section ---
-if not filtered_df.empty:
-    avg_calories = filtered_df['Caloric Value'].mean()
-    avg_protein = filtered_df['Protein'].mean()
-    avg_fat = filtered_df['Fat'].mean()
-    avg_carbs = filtered_df['Carbohydrates'].mean()
-    total_foods = filtered_df['food'].nunique()
-    max_calorie_food = filtered_df.loc[filtered_df['Caloric Value'].idxmax(), 'food']
-else:
-    avg_calories = avg_protein = avg_fat = avg_carbs = total_foods = 0
-    max_calorie_food = "N/A"
+avg_calories = results['kpis']['avg_calories']
+avg_protein = results['kpis']['avg_protein']
+avg_fat = results['kpis']['avg_fat']
+avg_carbs = results['kpis']['avg_carbs']
+total_foods = results['kpis']['total_foods']
 
 # Create 5 columns for KPI cards
 col1, col2, col3, col4, col5 = st.columns(5)
@@ -423,7 +698,7 @@ with col1:
     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
     st.markdown(f'<h3 class="chart-title">🏆 Top {show_top_n} High-Protein Foods</h3>', unsafe_allow_html=True)
     
-    top_protein = filtered_df.nlargest(show_top_n, 'Protein').sort_values('Protein', ascending=True)
+    top_protein = results['top_protein']
     fig_protein = px.bar(
         top_protein,
         x='Protein',
@@ -451,7 +726,7 @@ with col2:
     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
     st.markdown(f'<h3 class="chart-title">🍞 Top {show_top_n} High-Carb Foods</h3>', unsafe_allow_html=True)
     
-    top_carbs = filtered_df.nlargest(show_top_n, 'Carbohydrates').sort_values('Carbohydrates', ascending=True)
+    top_carbs = results['top_carbs']
     fig_carbs = px.bar(
         top_carbs,
         x='Carbohydrates',
@@ -483,11 +758,7 @@ with col1:
     st.markdown('<h3 class="chart-title">📊 Macronutrient Distribution</h3>', unsafe_allow_html=True)
     
     # Create pie chart for macronutrient totals
-    macro_totals = {
-        'Protein': filtered_df['Protein'].sum(),
-        'Fat': filtered_df['Fat'].sum(),
-        'Carbohydrates': filtered_df['Carbohydrates'].sum()
-    }
+    macro_totals = results['macro_totals']
     
     fig_pie = go.Figure(data=[go.Pie(
         labels=list(macro_totals.keys()),
@@ -514,7 +785,7 @@ with col2:
     st.markdown('<h3 class="chart-title">🔬 Protein vs. Calories Relationship</h3>', unsafe_allow_html=True)
     
     fig_scatter = px.scatter(
-        filtered_df,
+        selection.frame(['Caloric Value', 'Protein', 'Fat', 'Carbohydrates', 'food']),
         x='Caloric Value',
         y='Protein',
         size='Fat',
@@ -544,7 +815,7 @@ with col1:
     st.markdown('<h3 class="chart-title">📈 Caloric Distribution Analysis</h3>', unsafe_allow_html=True)
     
     fig_hist = px.histogram(
-        filtered_df,
+        selection.frame(['Caloric Value']),
         x='Caloric Value',
         nbins=30,
         labels={'Caloric Value': 'Calories (kcal)'},
@@ -568,7 +839,7 @@ with col2:
     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
     st.markdown('<h3 class="chart-title">🥇 Top Fat Content Foods</h3>', unsafe_allow_html=True)
     
-    top_fat = filtered_df.nlargest(show_top_n, 'Fat').sort_values('Fat', ascending=True)
+    top_fat = results['top_fat']
     fig_fat = px.bar(
         top_fat,
         x='Fat',
@@ -597,7 +868,7 @@ with col2:
 st.markdown('<div class="chart-container">', unsafe_allow_html=True)
 st.markdown('<h3 class="chart-title">🎯 Comparative Nutritional Profile - Top 5 Foods</h3>', unsafe_allow_html=True)
 
-top_5_foods = filtered_df.nlargest(5, 'Caloric Value')
+top_5_foods = results['top_5_foods']
 
 fig_radar = go.Figure()
 
@@ -611,9 +882,7 @@ for idx, row in top_5_foods.iterrows():
 
 fig_radar.update_layout(
     polar=dict(
-        radialaxis=dict(visible=True, range=[0, max(filtered_df['Protein'].max(), 
-                                                      filtered_df['Fat'].max(), 
-                                                      filtered_df['Carbohydrates'].max())])
+        radialaxis=dict(visible=True, range=[0, results['radar_max']])
     ),
     showlegend=True,
     plot_bgcolor='rgba(0,0,0,0)',
@@ -631,7 +900,7 @@ if show_raw_data:
     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
     st.markdown('<h3 class="chart-title">📋 Filtered Food Database</h3>', unsafe_allow_html=True)
     st.dataframe(
-        filtered_df.style.background_gradient(cmap='Blues', subset=['Caloric Value'])
+        selection.frame().style.background_gradient(cmap='Blues', subset=['Caloric Value'])
                          .background_gradient(cmap='Greens', subset=['Protein'])
                          .background_gradient(cmap='Oranges', subset=['Carbohydrates'])
                          .background_gradient(cmap='Reds', subset=['Fat'])
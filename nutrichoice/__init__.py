@@ -0,0 +1 @@
+"""Data layer for the NutriChoice dashboard."""
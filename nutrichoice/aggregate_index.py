@@ -0,0 +1,95 @@
+"""Range aggregates from prefix sums over the sorted nutrient orders.
+
+The rows inside one ``low <= value <= high`` range are a slice of that
+column's sort permutation (see ``filters.SortedColumn``). ``AggregateIndex``
+keeps, for a driving column and an aggregated column, the running sum and
+running count of non-missing values of the aggregated column taken in the
+driving column's sorted order. The sum, count and mean over any range of the
+driving column are then two binary searches and two subtractions, O(log n)
+whatever the number of rows in the range, so KPIs follow a slider without
+reading the rows.
+
+Prefix arrays are built lazily, the first time a pair of columns is
+aggregated, and held in a small LRU since each costs two values per row.
+Totals over every row are computed once per column. Anything but a single
+range (several ranges, groups, expressions, searches) has no such slice and
+is aggregated over the selected rows instead.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Pairs of (driving, aggregated) columns kept at once.
+DEFAULT_MAX_PAIRS = 32
+# Aggregates answered from the prefix sums.
+PREFIX_AGGREGATES = ('sum', 'count', 'mean')
+
+
+class _Prefix:
+    """Running sums and counts of one column in another column's sorted order."""
+
+    def __init__(self, values):
+        valid = ~np.isnan(values)
+        self.sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0), dtype=np.float64)))
+        # Without missing values the count of a slice is its length
+        self.counts = (np.concatenate(([0], np.cumsum(valid, dtype=np.int64)))
+                       if not valid.all() else None)
+
+    def total(self, start, stop):
+        count = (stop - start if self.counts is None
+                 else int(self.counts[stop] - self.counts[start]))
+        return float(self.sums[stop] - self.sums[start]), count
+
+
+class AggregateIndex:
+    """Sum, count and mean of any nutrient over a range of another, from prefix sums."""
+
+    def __init__(self, range_index, max_pairs=DEFAULT_MAX_PAIRS):
+        self.range_index = range_index
+        self.max_pairs = max_pairs
+        self._prefixes = OrderedDict()
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def _prefix(self, driver, column):
+        key = (driver, column)
+        with self._lock:
+            prefix = self._prefixes.get(key)
+            if prefix is not None:
+                self._prefixes.move_to_end(key)
+                return prefix
+        order = self.range_index.column(driver).order
+        prefix = _Prefix(self.range_index.values(column)[order])
+        with self._lock:
+            self._prefixes[key] = prefix
+            while len(self._prefixes) > self.max_pairs:
+                self._prefixes.popitem(last=False)
+        return prefix
+
+    def _total(self, column):
+        # Every row: one pass, once per column
+        total = self._totals.get(column)
+        if total is None:
+            values = self.range_index.values(column)
+            total = self._totals[column] = (float(np.nansum(values)),
+                                            int(np.count_nonzero(~np.isnan(values))))
+        return total
+
+    def aggregate(self, column, func, driver=None, low=None, high=None):
+        """Returns ``func`` (one of ``PREFIX_AGGREGATES``) of ``column`` over the
+        rows with ``low <= driver <= high``, or over every row without a driver.
+
+        Follows ``query.AGGREGATES``: missing values are skipped, an empty sum
+        or count is 0 and an empty mean is NaN.
+        """
+        if driver is None:
+            total, count = self._total(column)
+        else:
+            start, stop = self.range_index.column(driver).bounds(low, high)
+            total, count = self._prefix(driver, column).total(start, stop)
+        if func == 'sum':
+            return total
+        if func == 'count':
+            return count
+        return total / count if count else np.nan
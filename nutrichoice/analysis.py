@@ -0,0 +1,78 @@
+"""Term normalization for word search: light stemming plus food synonyms.
+
+``analyze`` maps a lower-case word to the term it is indexed and queried
+under, so "chickens" and "chicken", "potatoes" and "potato", or "aubergine"
+and "eggplant" all land on the same posting list. Pass it as the ``analyze``
+argument of ``tokens.TokenIndex``; the mapping then runs once per distinct
+word at load, and a query costs a dictionary lookup per word.
+"""
+# Each group lists interchangeable single-word names; the first one is the
+# term the whole group is indexed under. Words match as written or as a
+# plural of the word written, never by their own stem, so "sweets" is candy
+# but "sweet" stays sweet.
+SYNONYMS = [
+    ['eggplant', 'aubergine', 'brinjal'],
+    ['zucchini', 'courgette'],
+    ['cilantro', 'coriander'],
+    ['arugula', 'rocket', 'rucola'],
+    ['shrimp', 'prawn'],
+    ['chickpea', 'garbanzo'],
+    ['rutabaga', 'swede'],
+    ['beet', 'beetroot'],
+    ['yogurt', 'yoghurt', 'yoghourt'],
+    ['corn', 'maize'],
+    ['candy', 'sweets'],
+    ['ketchup', 'catsup'],
+    ['molasses', 'treacle'],
+    ['squid', 'calamari'],
+    ['doughnut', 'donut'],
+    ['liquorice', 'licorice'],
+]
+
+# Words whose trailing "s" is not a plural.
+_KEEP_S = ('ss', 'us', 'is', 'ys')
+
+# Singulars ending in "ie", whose plurals would otherwise stem to "-y"
+# (cookies -> cooky) and miss the singular.
+_IE_SINGULARS = {
+    'brie', 'brownie', 'calorie', 'cookie', 'cutie', 'goodie', 'hoagie',
+    'pie', 'pierogie', 'smoothie', 'veggie',
+}
+
+
+def stem(word):
+    """Strips English plural endings: berries -> berry, potatoes -> potato,
+    cookies -> cookie."""
+    if len(word) <= 3 or not word.isalpha():
+        return word
+    if word.endswith('ies') and word[:-1] in _IE_SINGULARS:
+        return word[:-1]
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith('oes'):
+        return word[:-2]
+    if word.endswith(('sses', 'ches', 'shes', 'xes')):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith(_KEEP_S):
+        return word[:-1]
+    return word
+
+
+def _synonym_terms(groups):
+    terms = {}
+    for group in groups:
+        canonical = stem(group[0])
+        for word in group:
+            terms[word] = canonical
+    return terms
+
+
+_SYNONYM_TERMS = _synonym_terms(SYNONYMS)
+
+
+def analyze(word):
+    """Maps a lower-case word to its indexed term."""
+    if word in _SYNONYM_TERMS:
+        return _SYNONYM_TERMS[word]
+    term = stem(word)
+    return _SYNONYM_TERMS.get(term, term)
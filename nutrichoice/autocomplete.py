@@ -0,0 +1,79 @@
+"""Prefix index for search-as-you-type suggestions.
+
+Every word start of every lower-cased food name ("kung pao chicken",
+"pao chicken", "chicken") is kept in one sorted list pointing back at its
+name, so the names with a word beginning with the typed text form one
+contiguous block found by two binary searches. Within the block, names that
+start with the text come first, then names with more rows in the catalogue.
+"""
+from bisect import bisect_left
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+DEFAULT_LIMIT = 8
+
+_MAX_CHAR = '\U0010ffff'
+
+
+def normalize(text):
+    """Lower-cases text and collapses runs of whitespace."""
+    return ' '.join(text.lower().split())
+
+
+class PrefixIndex:
+    """Sorted word-start suffixes of a list of names, with a score per name."""
+
+    def __init__(self, names, scores=None):
+        self.names = list(names)
+        self.scores = (np.zeros(len(self.names)) if scores is None
+                       else np.asarray(scores, dtype='float64'))
+        keys = []
+        counts = np.zeros(len(self.names), dtype=np.int32)
+        for name_id, name in enumerate(self.names):
+            words = name.lower().split()
+            lowered = ' '.join(words)  # normalize(name), split once
+            start = 0
+            for word in words:
+                keys.append(lowered[start:])
+                start += len(word) + 1
+            counts[name_id] = len(words)
+        ids = np.repeat(np.arange(len(self.names), dtype=np.int32), counts)
+        whole = np.ones(len(ids), dtype=bool)
+        whole[1:] = ids[1:] != ids[:-1]
+
+        keys = pa.array(keys, type=pa.string())
+        order = pc.sort_indices(keys)
+        self.keys = keys.take(order).to_pylist()
+        order = order.to_numpy()
+        self.ids, self.whole = ids[order], whole[order]
+        # A name occurs at most this many times in any block of keys.
+        self._max_repeats = max(np.bincount(self.ids).max() if len(self.ids) else 1, 1)
+
+    def __len__(self):
+        return len(self.names)
+
+    def complete(self, prefix, limit=DEFAULT_LIMIT):
+        """Returns up to ``limit`` names with a word starting with ``prefix``."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        start = bisect_left(self.keys, prefix)
+        stop = bisect_left(self.keys, prefix + _MAX_CHAR, lo=start)
+        ids, whole = self.ids[start:stop], self.whole[start:stop]
+        if not len(ids):
+            return []
+        scores = self.scores[ids]
+        keep = limit * self._max_repeats
+        if len(ids) > keep:
+            # Only the best entries can hold the best names; whole-name
+            # matches outrank any score.
+            lead = np.ptp(scores) + 1
+            best = np.argpartition(-(scores + whole * lead), keep - 1)[:keep]
+            ids, whole, scores = ids[best], whole[best], scores[best]
+        # Best entry per name: whole-name matches first, then higher scores.
+        order = np.lexsort((ids, -scores, ~whole))
+        _, first = np.unique(ids[order], return_index=True)
+        ranked = order[np.sort(first)][:limit]
+        return [self.names[i] for i in ids[ranked]]
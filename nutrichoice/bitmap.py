@@ -0,0 +1,153 @@
+"""Bitmap index for combining range, category and preset predicates.
+
+A bitmap is one bit per row packed into little-endian ``uint64`` words, so
+combining predicates is a handful of vectorized word-wise AND/OR/ANDNOT
+operations and counting matches is a popcount, without materializing rows.
+
+``BitmapIndex`` keeps bitmaps for every category of the categorical columns,
+for every diet preset, and, per nutrient, for equi-depth buckets of the
+column's sort order. A range is the OR of the buckets lying entirely inside
+it; only the rows of the two edge buckets are checked against the exact
+bounds and set individually. Nutrient buckets are built the first time a
+column is queried.
+"""
+import threading
+
+import numpy as np
+
+from nutrichoice.filters import RangeIndex
+from nutrichoice.presets import DIET_PRESETS
+
+DEFAULT_BUCKETS = 32
+
+
+def bits_from_mask(mask):
+    """Packs a boolean row mask into a bitmap."""
+    packed = np.packbits(np.asarray(mask, dtype=bool), bitorder='little')
+    padded = np.zeros(-(-len(packed) // 8) * 8, dtype=np.uint8)
+    padded[:len(packed)] = packed
+    return padded.view('<u8')
+
+
+def bits_from_rows(rows, n):
+    """Builds a bitmap with the bits of ``rows`` set."""
+    mask = np.zeros(n, dtype=bool)
+    mask[rows] = True
+    return bits_from_mask(mask)
+
+
+def and_(*bitmaps):
+    return np.bitwise_and.reduce(bitmaps)
+
+
+def or_(*bitmaps):
+    return np.bitwise_or.reduce(bitmaps)
+
+
+def andnot(bits, other):
+    """Rows set in ``bits`` but not in ``other``."""
+    return bits & ~other
+
+
+def count(bits):
+    """Counts the set rows (popcount)."""
+    return int(np.bitwise_count(bits).sum())
+
+
+class BitmapIndex:
+    """Packed bitmaps per category, per preset and per nutrient bucket."""
+
+    def __init__(self, df, range_index=None, buckets=DEFAULT_BUCKETS,
+                 categorical=(), presets=DIET_PRESETS):
+        self.rows = len(df)
+        self.buckets = buckets
+        self._range_index = range_index or RangeIndex(df)
+        self._bucket_bits = {}
+        self._lock = threading.Lock()
+
+        self.categories = {}
+        # Rows with any category at all, for selections written as exclusions
+        self._known = {}
+        for col in categorical:
+            codes = df[col].cat.codes.to_numpy()
+            self._known[col] = bits_from_mask(codes >= 0)
+            self.categories[col] = {
+                value: bits_from_mask(codes == code)
+                for code, value in enumerate(df[col].cat.categories)
+            }
+        self.presets = {}
+        for name, ranges in presets.items():
+            mask = np.ones(self.rows, dtype=bool)
+            for col, (low, high) in ranges.items():
+                values = df[col].to_numpy()
+                mask &= (values >= low) & (values <= high)
+            self.presets[name] = bits_from_mask(mask)
+
+    def all(self):
+        return bits_from_mask(np.ones(self.rows, dtype=bool))
+
+    def _buckets(self, col):
+        """Bucket bitmaps and ``[start, stop)`` sort positions for one nutrient."""
+        built = self._bucket_bits.get(col)
+        if built is None:
+            with self._lock:
+                built = self._bucket_bits.get(col)
+                if built is None:
+                    order = self._range_index.column(col).order
+                    edges = np.linspace(0, self.rows, self.buckets + 1).astype(np.int64)
+                    bits = [bits_from_rows(order[start:stop], self.rows)
+                            for start, stop in zip(edges[:-1], edges[1:])]
+                    built = self._bucket_bits[col] = (edges, bits)
+        return built
+
+    def range(self, col, low, high):
+        """Bitmap of the rows with ``low <= col <= high``."""
+        sorted_column = self._range_index.column(col)
+        start, stop = sorted_column.bounds(low, high)
+        edges, bits = self._buckets(col)
+        # Buckets entirely inside [start, stop) are OR'd whole.
+        first = int(np.searchsorted(edges, start, side='left'))
+        last = int(np.searchsorted(edges, stop, side='right')) - 1
+        if first < last:
+            result = or_(*bits[first:last])
+            inner_start, inner_stop = edges[first], edges[last]
+        else:
+            result = np.zeros_like(bits[0]) if bits else bits_from_mask([])
+            inner_start = inner_stop = stop
+        # Only the edge buckets' rows are set one by one.
+        edge_rows = np.concatenate((sorted_column.order[start:inner_start],
+                                    sorted_column.order[inner_stop:stop]))
+        if len(edge_rows):
+            result = result | bits_from_rows(edge_rows, self.rows)
+        return result
+
+    def category(self, col, values):
+        """Bitmap of the rows whose categorical ``col`` is one of ``values``.
+
+        When most categories are allowed, the deselected ones are OR'd and
+        removed from the known rows with ANDNOT, so deselecting a group or
+        two reads only their bitmaps.
+        """
+        values = set(values)
+        kept = [bits for value, bits in self.categories[col].items() if value in values]
+        dropped = [bits for value, bits in self.categories[col].items() if value not in values]
+        if len(dropped) < len(kept):
+            return andnot(self._known[col], or_(*dropped)) if dropped else self._known[col]
+        return or_(*kept) if kept else np.zeros_like(self.all())
+
+    def select(self, ranges=None, categories=None, presets=()):
+        """ANDs every predicate; returns the bitmap of matching rows.
+
+        ``categories`` maps categorical columns to the allowed values.
+        """
+        parts = [self.range(col, low, high) for col, (low, high) in (ranges or {}).items()]
+        parts += [self.category(col, values) for col, values in (categories or {}).items()]
+        parts += [self.presets[name] for name in presets]
+        return and_(*parts) if parts else self.all()
+
+    def positions(self, bits):
+        """Sorted row positions of a bitmap, or ``None`` when every row is set."""
+        if count(bits) == self.rows:
+            return None
+        mask = np.unpackbits(bits.view(np.uint8), bitorder='little')[:self.rows]
+        return np.flatnonzero(mask)
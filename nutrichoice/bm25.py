@@ -0,0 +1,188 @@
+"""Ranked multi-word search over the food names.
+
+Queries are words combined with ``AND`` (also implied between words), ``OR``
+and ``NOT`` (or a leading ``-``), with parentheses for grouping and double
+quotes for phrases whose words must appear next to each other::
+
+    cheese low fat
+    "cream cheese" OR ricotta
+    chicken -fried
+
+Each word is mapped through the index's analyzer (stemming and synonyms, when
+configured) and answered from the posting lists of ``tokens.TokenIndex``, and
+boolean operators combine one mask per term over the distinct names. Matches
+are scored with BM25 over the words that are not negated, and the best ``k``
+are taken with a heap, so the number of matches never costs a full sort.
+"""
+import heapq
+import re
+
+import numpy as np
+
+from nutrichoice.tokens import tokenize
+
+K1 = 1.2
+B = 0.75
+
+_QUERY_TOKEN = re.compile(r'"([^"]*)"?|(\()|(\))|([^\s()"]+)')
+_OPERATORS = {'AND', 'OR', 'NOT'}
+
+
+class QueryError(ValueError):
+    """Raised for a query that cannot be parsed."""
+
+
+def lex(query):
+    """Splits a query into ``('phrase', words)``, ``('op', name)`` and paren tokens."""
+    items = []
+    for match in _QUERY_TOKEN.finditer(query):
+        phrase, opening, closing, word = match.groups()
+        if phrase is not None:
+            items.append(('phrase', tokenize(phrase)))
+        elif opening:
+            items.append(('(', None))
+        elif closing:
+            items.append((')', None))
+        elif word in _OPERATORS:
+            items.append(('op', word))
+        elif word.startswith('-') and len(word) > 1:
+            items.append(('op', 'NOT'))
+            items.append(('phrase', tokenize(word[1:])))
+        else:
+            items.append(('phrase', tokenize(word)))
+    # Punctuation-only words tokenize to nothing and are dropped.
+    return [item for item in items if item[0] != 'phrase' or item[1]]
+
+
+class _Parser:
+    """Recursive-descent parser building ``(op, ...)`` tuples from lexed tokens."""
+
+    def __init__(self, items):
+        self.items = items
+        self.at = 0
+
+    def peek(self):
+        return self.items[self.at] if self.at < len(self.items) else (None, None)
+
+    def take(self):
+        item = self.peek()
+        self.at += 1
+        return item
+
+    def parse(self):
+        if not self.items:
+            return None
+        node = self.disjunction()
+        if self.at < len(self.items):
+            raise QueryError('unbalanced parentheses')
+        return node
+
+    def disjunction(self):
+        nodes = [self.conjunction()]
+        while self.peek() == ('op', 'OR'):
+            self.take()
+            nodes.append(self.conjunction())
+        return nodes[0] if len(nodes) == 1 else ('or', nodes)
+
+    def conjunction(self):
+        nodes = [self.unary()]
+        while self.peek()[0] in ('phrase', '(') or self.peek() in (('op', 'AND'), ('op', 'NOT')):
+            if self.peek() == ('op', 'AND'):
+                self.take()
+            nodes.append(self.unary())
+        return nodes[0] if len(nodes) == 1 else ('and', nodes)
+
+    def unary(self):
+        kind, value = self.take()
+        if (kind, value) == ('op', 'NOT'):
+            return ('not', self.unary())
+        if kind == '(':
+            node = self.disjunction()
+            if self.take()[0] != ')':
+                raise QueryError('missing closing parenthesis')
+            return node
+        if kind == 'phrase':
+            return ('phrase', value)
+        raise QueryError(f'unexpected {value or kind or "end of query"}')
+
+
+def parse_query(query):
+    """Parses a search query into a tree; ``None`` for an empty query."""
+    return _Parser(lex(query)).parse()
+
+
+def top_k(ids, scores, k):
+    """Returns the ``k`` best ``(score, id)`` pairs, best first, using a heap.
+
+    Ties go to the lower id, so the order is stable across runs.
+    """
+    return [(score, -neg_id) for score, neg_id in
+            heapq.nlargest(k, zip(scores.tolist(), (-ids).tolist()))]
+
+
+class BM25Index:
+    """Boolean matching and BM25 scoring over a ``TokenIndex``."""
+
+    def __init__(self, tokens, k1=K1, b=B):
+        self.tokens = tokens
+        names = len(tokens)
+        doc_freq = tokens.doc_freq
+        self.idf = np.log(1 + (names - doc_freq + 0.5) / (doc_freq + 0.5))
+        lengths = tokens.lengths
+        average = lengths.mean() if names else 1.0
+        self._norm = k1 * (1 - b + b * lengths / (average or 1.0))
+        self.k1 = k1
+
+    def _word_mask(self, word):
+        mask = np.zeros(len(self.tokens), dtype=bool)
+        word_id = self.tokens.word_id(word)
+        if word_id is not None:
+            mask[self.tokens.posting(word_id)] = True
+        return mask
+
+    def _phrase_mask(self, words):
+        mask = np.logical_and.reduce([self._word_mask(word) for word in words])
+        if len(words) > 1:
+            width = len(words)
+            for name_id in np.flatnonzero(mask):
+                name_words = self.tokens.terms(self.tokens.names[name_id])
+                if not any(name_words[i:i + width] == words
+                           for i in range(len(name_words) - width + 1)):
+                    mask[name_id] = False
+        return mask
+
+    def _evaluate(self, node, positive, scored):
+        op, value = node
+        if op == 'phrase':
+            terms = [self.tokens.term(word) for word in value]
+            if positive:
+                scored.extend(terms)
+            return self._phrase_mask(terms)
+        if op == 'not':
+            return ~self._evaluate(value, not positive, scored)
+        masks = [self._evaluate(child, positive, scored) for child in value]
+        return np.logical_and.reduce(masks) if op == 'and' else np.logical_or.reduce(masks)
+
+    def _scores(self, words, mask):
+        scores = np.zeros(len(self.tokens))
+        for word in set(words):
+            word_id = self.tokens.word_id(word)
+            if word_id is None:
+                continue
+            posting = self.tokens.posting(word_id)
+            tf = self.tokens.term_counts(word_id)
+            scores[posting] += self.idf[word_id] * tf * (self.k1 + 1) / (tf + self._norm[posting])
+        return np.where(mask, scores, 0.0)
+
+    def search(self, query):
+        """Returns ``(ids, scores)``: every matching name id, in id order, and its score.
+
+        Raises ``QueryError`` for a malformed query.
+        """
+        tree = parse_query(query)
+        if tree is None:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        scored = []
+        mask = self._evaluate(tree, True, scored)
+        ids = np.flatnonzero(mask)
+        return ids, self._scores(scored, mask)[ids]
@@ -0,0 +1,182 @@
+"""Cleaning pipeline from a raw food export to the cleaned dashboard CSV.
+
+Raw exports such as ``FOOD-DATA-GROUP1.csv`` carry leftover index columns,
+inconsistently spelled headers and numbers stored as text. ``clean_frame``
+turns one chunk of raw rows into the cleaned layout with vectorized pandas
+operations only:
+
+* index columns (``''``, ``Unnamed: 0``, ...) are dropped,
+* headers are matched case- and whitespace-insensitively to the schema,
+* food names are trimmed, lower-cased and whitespace-collapsed,
+* numbers are parsed (thousands separators and stray spaces removed),
+* rows with a missing name or a negative/unparseable nutrient are dropped.
+
+``clean_file`` streams the raw file through ``clean_frame`` in chunks and
+records how many raw bytes it consumed in a small state file next to the
+output. An ``incremental`` run starts reading at that offset and appends only
+the newly cleaned rows.
+
+Usage::
+
+    python -m nutrichoice.cleaning FOOD-DATA-GROUP1.csv FOOD-DATA-GROUP1_cleaned.csv
+    python -m nutrichoice.cleaning FOOD-DATA-GROUP1.csv FOOD-DATA-GROUP1_cleaned.csv --incremental
+"""
+import argparse
+import csv
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from nutrichoice.schema import COLUMNS, FOOD_COLUMN, NUTRIENT_COLUMNS
+
+DEFAULT_CHUNKSIZE = 100_000
+
+# Energy is reported in whole kcal; every other nutrient is a float.
+INTEGER_COLUMNS = ['Caloric Value']
+
+_CANONICAL_NAMES = {' '.join(col.lower().split()): col for col in COLUMNS}
+
+
+def state_path(out_path):
+    """Returns the path of the incremental state file for a cleaned CSV."""
+    return out_path + '.state.json'
+
+
+def normalize_header(name):
+    """Maps a raw header to its schema name, or ``None`` for unknown columns."""
+    return _CANONICAL_NAMES.get(' '.join(str(name).lower().split()))
+
+
+def clean_frame(raw):
+    """Cleans one chunk of raw rows and returns ``(cleaned, dropped)``."""
+    renames = {col: normalize_header(col) for col in raw.columns}
+    missing = set(COLUMNS) - set(renames.values())
+    if missing:
+        raise ValueError(f"Raw data is missing columns: {', '.join(sorted(missing))}")
+    # Index columns and anything else outside the schema are dropped here.
+    df = raw[[col for col, name in renames.items() if name]].rename(columns=renames)
+
+    # Taken before the conversion: pandas 2 turns a missing name into 'nan'
+    named = df[FOOD_COLUMN].notna().to_numpy()
+    food = df[FOOD_COLUMN].astype('str').str.strip().str.lower()
+    food = food.str.replace(r'\s+', ' ', regex=True)
+
+    data = {FOOD_COLUMN: food}
+    for col in NUTRIENT_COLUMNS:
+        values = df[col]
+        if not pd.api.types.is_numeric_dtype(values):
+            values = values.astype('str').str.replace(r'[\s,]', '', regex=True)
+            values = pd.to_numeric(values, errors='coerce')
+        data[col] = values.astype('float64')
+    cleaned = pd.DataFrame(data)
+
+    nutrients = cleaned[NUTRIENT_COLUMNS].to_numpy(na_value=np.nan)
+    valid = (named & (food != '').to_numpy()
+             & np.isfinite(nutrients).all(axis=1) & (nutrients >= 0).all(axis=1))
+    cleaned = cleaned[valid]
+    cleaned = cleaned.assign(
+        **{col: cleaned[col].round().astype('int64') for col in INTEGER_COLUMNS})
+    return cleaned, int((~valid).sum())
+
+
+class _ByteRange(io.RawIOBase):
+    """A read-only file object over ``[start, end)`` of an open binary file."""
+
+    def __init__(self, f, start, end):
+        f.seek(start)
+        self._f = f
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        data = self._f.read(size)
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+
+def _read_header(raw_path):
+    with open(raw_path, newline='', encoding='utf-8') as f:
+        header = next(csv.reader(f))
+    with open(raw_path, 'rb') as f:
+        header_bytes = len(f.readline())
+    return header, header_bytes
+
+
+def _load_state(out_path):
+    try:
+        with open(state_path(out_path), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_state(out_path, state):
+    tmp_path = state_path(out_path) + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, state_path(out_path))
+
+
+def clean_file(raw_path, out_path, incremental=False, chunksize=DEFAULT_CHUNKSIZE):
+    """Cleans ``raw_path`` into ``out_path`` and returns a summary dict.
+
+    Only the raw bytes present when the run starts are read, so rows that are
+    still being appended to the raw file are picked up by the next run.
+    """
+    header, header_bytes = _read_header(raw_path)
+    end = os.path.getsize(raw_path)
+    state = _load_state(out_path) if incremental else None
+    resume = (state is not None and state['header'] == header
+              and state['raw_bytes'] <= end and os.path.exists(out_path))
+
+    start = state['raw_bytes'] if resume else header_bytes
+    target = out_path if resume else out_path + '.tmp'
+    if not resume:
+        pd.DataFrame(columns=COLUMNS).to_csv(target, index=False)
+
+    rows_in = rows_out = dropped = 0
+    with open(raw_path, 'rb') as f:
+        if end > start:
+            reader = pd.read_csv(_ByteRange(f, start, end), header=None, names=header,
+                                 chunksize=chunksize, index_col=False)
+            for chunk in reader:
+                cleaned, bad = clean_frame(chunk)
+                cleaned.to_csv(target, mode='a', header=False, index=False)
+                rows_in += len(chunk)
+                rows_out += len(cleaned)
+                dropped += bad
+
+    if not resume:
+        os.replace(target, out_path)
+    _save_state(out_path, {'header': header, 'raw_bytes': end})
+    return {'incremental': resume, 'rows_in': rows_in, 'rows_out': rows_out,
+            'dropped': dropped}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Clean a raw food export.')
+    parser.add_argument('raw', help='raw food CSV, e.g. FOOD-DATA-GROUP1.csv')
+    parser.add_argument('out', help='cleaned CSV to write')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only clean rows added to the raw file since the last run')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help='rows per chunk')
+    args = parser.parse_args(argv)
+
+    summary = clean_file(args.raw, args.out, incremental=args.incremental,
+                         chunksize=args.chunksize)
+    mode = 'appended' if summary['incremental'] else 'wrote'
+    print(f"{mode} {summary['rows_out']:,} of {summary['rows_in']:,} rows to {args.out}"
+          f" ({summary['dropped']:,} dropped as invalid)")
+
+
+if __name__ == '__main__':
+    main()
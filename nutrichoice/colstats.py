@@ -0,0 +1,209 @@
+"""Column statistics computed once per dataset and kept next to its data.
+
+For every nutrient column ``ColumnStats`` holds the row count, null count,
+sum, min, max, mean, percentiles and the number of distinct values; for the
+food name column the counts and distinct names. The dashboard's slider bounds
+and quick stats, and the planner's histograms, are read from these instead of
+from the rows.
+
+All statistics merge, so appending a chunk of rows only computes the chunk's
+statistics and merges them in: counts, sums and extremes exactly, percentiles
+by mixing the two distributions' piecewise-linear CDFs, and distinct counts
+through a k-minimum-values sketch (the ``SKETCH_SIZE`` smallest value hashes),
+which is exact while there are fewer distinct values than that and an
+estimate within a few percent beyond. An exact distinct count (the size of a
+store's name table, say) can be set where it is known.
+
+``TableStats`` is written to ``stats.json`` inside a column store and tagged
+with the data directory and row count it describes, so a stale file is never
+mistaken for a current one.
+"""
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+STATS_FILE = 'stats.json'
+PERCENTILES = np.linspace(0, 1, 101)
+SKETCH_SIZE = 1024
+
+_HASH_SPACE = float(2 ** 64)
+
+
+def _sketch(values):
+    """The smallest ``SKETCH_SIZE`` distinct 64-bit hashes of ``values``."""
+    hashes = np.unique(pd.util.hash_array(np.asarray(values)))
+    return hashes[:SKETCH_SIZE]
+
+
+def _mix_percentiles(a, a_count, b, b_count):
+    # Mixture of two distributions known by their percentiles, read back at
+    # the same levels.
+    grid = np.union1d(a, b)
+    cdf = (a_count * np.interp(grid, a, PERCENTILES)
+           + b_count * np.interp(grid, b, PERCENTILES)) / (a_count + b_count)
+    return np.interp(PERCENTILES, cdf, grid)
+
+
+class ColumnStats:
+    """Mergeable summary of one column; numeric fields are ``None`` for names."""
+
+    def __init__(self, count=0, nulls=0, total=None, low=None, high=None,
+                 percentiles=None, sketch=None, exact_distinct=None):
+        self.count = count
+        self.nulls = nulls
+        self.sum = total
+        self.min = low
+        self.max = high
+        self.percentiles = percentiles
+        self.sketch = np.empty(0, dtype=np.uint64) if sketch is None else sketch
+        self.exact_distinct = exact_distinct
+
+    @classmethod
+    def from_values(cls, values):
+        """Computes the statistics of an array of numbers or names."""
+        values = np.asarray(values)
+        if values.dtype.kind == 'f':
+            missing = np.isnan(values)
+            valid = values[~missing]
+            stats = cls(count=len(valid), nulls=int(missing.sum()),
+                        total=float(valid.sum(dtype='float64')))
+            if len(valid):
+                stats.min, stats.max = float(valid.min()), float(valid.max())
+                stats.percentiles = np.quantile(valid, PERCENTILES)
+        else:
+            missing = pd.isna(values)
+            valid = values[~missing]
+            stats = cls(count=len(valid), nulls=int(missing.sum()))
+        distinct = pd.unique(valid)
+        stats.sketch = _sketch(distinct)
+        stats.exact_distinct = len(distinct)
+        return stats
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count and self.sum is not None else None
+
+    @property
+    def distinct(self):
+        """Exact distinct count if known, else the sketch's estimate."""
+        if self.exact_distinct is not None:
+            return self.exact_distinct
+        if len(self.sketch) < SKETCH_SIZE:
+            return len(self.sketch)
+        return int(round((SKETCH_SIZE - 1) / (float(self.sketch[-1]) / _HASH_SPACE)))
+
+    def merge(self, other):
+        """Returns the statistics of both columns' rows together."""
+        if not other.count and not other.nulls:
+            return self
+        if not self.count and not self.nulls:
+            return other
+        merged = ColumnStats(count=self.count + other.count, nulls=self.nulls + other.nulls)
+        if self.sum is not None or other.sum is not None:
+            merged.sum = (self.sum or 0.0) + (other.sum or 0.0)
+            extremes = [v for v in (self.min, self.max, other.min, other.max) if v is not None]
+            if extremes:
+                merged.min, merged.max = min(extremes), max(extremes)
+            if self.percentiles is None or other.percentiles is None:
+                merged.percentiles = self.percentiles if other.percentiles is None else other.percentiles
+            else:
+                merged.percentiles = _mix_percentiles(self.percentiles, self.count,
+                                                      other.percentiles, other.count)
+                merged.percentiles[0], merged.percentiles[-1] = merged.min, merged.max
+        merged.sketch = np.union1d(self.sketch, other.sketch)[:SKETCH_SIZE]
+        return merged
+
+    def quantile(self, q):
+        """Approximate value at quantile ``q`` (0..1), or ``None`` without values."""
+        if self.percentiles is None:
+            return None
+        return float(np.interp(q, PERCENTILES, self.percentiles))
+
+    def to_dict(self):
+        return {
+            'count': self.count, 'nulls': self.nulls, 'sum': self.sum,
+            'min': self.min, 'max': self.max,
+            'percentiles': None if self.percentiles is None else self.percentiles.tolist(),
+            'sketch': self.sketch.tolist(), 'exact_distinct': self.exact_distinct,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        percentiles = data['percentiles']
+        return cls(count=data['count'], nulls=data['nulls'], total=data['sum'],
+                   low=data['min'], high=data['max'],
+                   percentiles=None if percentiles is None else np.array(percentiles),
+                   sketch=np.array(data['sketch'], dtype=np.uint64),
+                   exact_distinct=data['exact_distinct'])
+
+
+class TableStats:
+    """``ColumnStats`` for every column of a table, plus the row count."""
+
+    def __init__(self, rows=0, columns=None, groups=None):
+        self.rows = rows
+        self.columns = columns or {}
+        # Rows per food group, for statistics merged over a catalog of groups
+        self.groups = groups or {}
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @classmethod
+    def from_frame(cls, df):
+        """Computes the statistics of every column of a frame."""
+        columns = {}
+        for col in df.columns:
+            series = df[col]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                codes = series.cat.codes.to_numpy()
+                present = np.flatnonzero(np.bincount(codes[codes >= 0],
+                                                     minlength=len(series.cat.categories)))
+                names = series.cat.categories.to_numpy()[present]
+                stats = ColumnStats(count=int((codes >= 0).sum()), nulls=int((codes < 0).sum()),
+                                    sketch=_sketch(names), exact_distinct=len(names))
+            elif series.dtype.kind == 'f':
+                stats = ColumnStats.from_values(series.to_numpy())
+            else:
+                stats = ColumnStats.from_values(series.to_numpy(dtype=object))
+            columns[col] = stats
+        return cls(len(df), columns)
+
+    def merge(self, other):
+        """Returns the statistics of both tables' rows together."""
+        names = list(self.columns) + [col for col in other.columns if col not in self.columns]
+        empty = ColumnStats()
+        return TableStats(self.rows + other.rows, {
+            col: self.columns.get(col, empty).merge(other.columns.get(col, empty)) for col in names
+        })
+
+    def to_dict(self):
+        return {'rows': self.rows, 'columns': {col: stats.to_dict() for col, stats in self.columns.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['rows'], {col: ColumnStats.from_dict(stats)
+                                  for col, stats in data['columns'].items()})
+
+
+def read_stats(path, manifest):
+    """Reads a store's statistics, or ``None`` if missing or not for ``manifest``'s data."""
+    try:
+        with open(os.path.join(path, STATS_FILE), encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get('data_dir') != manifest['data_dir'] or data.get('rows') != manifest['rows']:
+        return None
+    return TableStats.from_dict(data['stats'])
+
+
+def write_stats(path, stats, data_dir):
+    """Atomically writes a store's statistics, tagged with the data they describe."""
+    tmp_path = os.path.join(path, f'{STATS_FILE}.{uuid.uuid4().hex}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'data_dir': data_dir, 'rows': stats.rows, 'stats': stats.to_dict()}, f)
+    os.replace(tmp_path, os.path.join(path, STATS_FILE))
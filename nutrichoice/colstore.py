@@ -0,0 +1,338 @@
+"""Read-only, memory-mapped column store for the nutrient data.
+
+Each nutrient column is a raw little-endian array in its own file. Food names
+are dictionary-encoded: ``food.codes`` holds one int32 code per row and
+``food.dict`` the distinct names, one per line, in code order. Catalogues repeat
+names heavily, so this is far smaller than one string per row, and the
+dashboard gets the column as a ``Categorical`` whose string operations and
+distinct counts run over the codes and the short name table.
+``manifest.json`` records the row count, the file and dtype of every column,
+and the fingerprint of the CSV the store was built from (``None`` for stores
+filled by ``nutrichoice.ingest``).
+
+Opening a store maps the column files instead of reading them, so every
+Streamlit session and every worker process on the host shares the same page
+cache pages. Rebuilds write a fresh data directory and then swap the manifest,
+which means readers that already mapped the old files keep a consistent view.
+
+Writers keep the column statistics of ``nutrichoice.colstats`` up to date as
+they append and write them to ``stats.json`` with every commit, so summaries of
+a store never need a pass over its rows.
+
+Usage::
+
+    python -m nutrichoice.colstore FOOD-DATA-GROUP1_cleaned.csv
+"""
+import argparse
+import json
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from nutrichoice.colstats import TableStats, read_stats, write_stats
+from nutrichoice.locking import file_lock
+from nutrichoice.schema import FOOD_COLUMN, NUTRIENT_COLUMNS
+from nutrichoice.signature import source_fingerprint
+from nutrichoice.storage import read_dataset
+
+MANIFEST = 'manifest.json'
+LOCK_FILE = 'writer.lock'
+CODES_FILE = 'food.codes'
+DICT_FILE = 'food.dict'
+CODES_DTYPE = '<i4'
+DEFAULT_DTYPE = 'float64'
+# Bumped whenever the on-disk layout changes; older stores are rebuilt.
+FORMAT_VERSION = 2
+
+
+def store_path(csv_path):
+    """Returns the column store directory that belongs to a CSV dataset."""
+    if csv_path.endswith('.columns'):
+        return csv_path
+    return os.path.splitext(csv_path)[0] + '.columns'
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_manifest(path, manifest):
+    """Atomically replaces the manifest of a store."""
+    tmp_path = os.path.join(path, f'{MANIFEST}.{uuid.uuid4().hex}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(path, MANIFEST))
+
+
+def normalize_names(names):
+    """Food names as strings without line breaks, ready for the name table."""
+    return pd.Series(names, dtype='str').fillna('').str.replace('\n', ' ', regex=False)
+
+
+def encode_lines(values):
+    """Encodes strings as newline-terminated UTF-8 lines."""
+    return ''.join(value + '\n' for value in values).encode('utf-8')
+
+
+def new_data_dir(path):
+    """Creates an empty, uniquely named data directory inside a store."""
+    data_dir = f'data-{uuid.uuid4().hex[:12]}'
+    os.makedirs(os.path.join(path, data_dir))
+    return data_dir
+
+
+@contextmanager
+def store_lock(path):
+    """Holds the writer lock of the store at ``path`` (created if missing).
+
+    Every build, ingest and append runs under it, from its first write to its
+    last commit, so no writer ever removes a data directory another one is
+    still filling. Readers never take it. The lock is per open file, so it
+    also excludes threads of the same process, but it is not reentrant.
+    """
+    os.makedirs(path, exist_ok=True)
+    with file_lock(os.path.join(path, LOCK_FILE)):
+        yield
+
+
+def remove_stale_data_dirs(path, keep):
+    """Best-effort cleanup of data directories the manifest no longer uses.
+
+    Only safe under ``store_lock``: any other data directory then belongs to
+    an earlier writer that has finished or died.
+    """
+    for entry in os.listdir(path):
+        if entry.startswith('data-') and entry != keep:
+            # Open mappings keep their pages alive on POSIX; on platforms that
+            # refuse to delete mapped files the directory is retried next build.
+            shutil.rmtree(os.path.join(path, entry), ignore_errors=True)
+
+
+class StoreWriter:
+    """Appends row chunks to the column files of one data directory.
+
+    Nothing is visible to readers until ``commit`` swaps in a manifest that
+    covers the rows written so far, so a crashed write never exposes partial
+    chunks; ``open`` trims any such leftovers before appending again. Hold
+    ``store_lock`` from ``create`` or ``open`` until the last ``commit``.
+    """
+
+    def __init__(self, path, data_dir, columns, rows=0, dictionary=(), dict_bytes=0,
+                 source=None, stats=None):
+        self.path = path
+        self.data_dir = data_dir
+        self.columns = columns
+        self.rows = rows
+        self.dict_bytes = dict_bytes
+        self.source = source
+        self.stats = stats or TableStats()
+        self._codes = {name: code for code, name in enumerate(dictionary)}
+
+    @classmethod
+    def create(cls, path, dtype=DEFAULT_DTYPE, source=None):
+        """Starts a new, empty data directory in the store at ``path``."""
+        dtype = np.dtype(dtype).newbyteorder('<')
+        os.makedirs(path, exist_ok=True)
+        data_dir = new_data_dir(path)
+        columns = {col: {'file': f'{i:02d}.bin', 'dtype': dtype.str}
+                   for i, col in enumerate(NUTRIENT_COLUMNS)}
+        writer = cls(path, data_dir, columns, source=source)
+        for file_name in writer._files():
+            open(writer._file_path(file_name), 'wb').close()
+        return writer
+
+    @classmethod
+    def open(cls, path):
+        """Reopens the committed data directory of a store for appending."""
+        manifest = read_manifest(path)
+        check_format(path, manifest)
+        dictionary = read_dictionary(os.path.join(path, manifest['data_dir']), manifest)
+        writer = cls(path, manifest['data_dir'], manifest['columns'],
+                     rows=manifest['rows'], dictionary=dictionary,
+                     dict_bytes=manifest['dict_bytes'], source=manifest.get('source'),
+                     stats=ColumnStore(path).stats())
+        for col, spec in writer.columns.items():
+            size = writer.rows * np.dtype(spec['dtype']).itemsize
+            os.truncate(writer._file_path(spec['file']), size)
+        os.truncate(writer._file_path(CODES_FILE), writer.rows * np.dtype(CODES_DTYPE).itemsize)
+        os.truncate(writer._file_path(DICT_FILE), writer.dict_bytes)
+        return writer
+
+    def _files(self):
+        return [spec['file'] for spec in self.columns.values()] + [CODES_FILE, DICT_FILE]
+
+    def _file_path(self, file_name):
+        return os.path.join(self.path, self.data_dir, file_name)
+
+    def _encode(self, names):
+        """Returns the codes of ``names`` and the names new to the dictionary."""
+        chunk_codes, uniques = pd.factorize(names)
+        # Only the distinct names of the chunk go through the Python dict.
+        mapping = np.empty(len(uniques), dtype=CODES_DTYPE)
+        added = []
+        for i, name in enumerate(uniques):
+            code = self._codes.get(name)
+            if code is None:
+                code = self._codes[name] = len(self._codes)
+                added.append(name)
+            mapping[i] = code
+        return mapping[chunk_codes], added
+
+    def append(self, df):
+        """Writes the rows of ``df`` to the end of every column file."""
+        written = {}
+        for col, spec in self.columns.items():
+            values = written[col] = df[col].to_numpy(dtype=spec['dtype'], na_value=np.nan)
+            with open(self._file_path(spec['file']), 'ab') as f:
+                np.ascontiguousarray(values).tofile(f)
+        names = normalize_names(df[FOOD_COLUMN])
+        codes, added = self._encode(names)
+        # Only the new rows are summarized; the name table gives exact distinct names
+        written = pd.DataFrame({FOOD_COLUMN: names.to_numpy(dtype=object), **written})
+        self.stats = self.stats.merge(TableStats.from_frame(written))
+        self.stats[FOOD_COLUMN].exact_distinct = len(self._codes)
+        with open(self._file_path(CODES_FILE), 'ab') as f:
+            codes.tofile(f)
+        lines = encode_lines(added)
+        with open(self._file_path(DICT_FILE), 'ab') as f:
+            f.write(lines)
+        self.rows += len(df)
+        self.dict_bytes += len(lines)
+
+    def commit(self):
+        """Publishes the rows written so far to readers of the store."""
+        write_stats(self.path, self.stats, self.data_dir)
+        write_manifest(self.path, {
+            'format': FORMAT_VERSION,
+            'rows': self.rows,
+            'dict_size': len(self._codes),
+            'dict_bytes': self.dict_bytes,
+            'data_dir': self.data_dir,
+            'columns': self.columns,
+            'source': self.source,
+        })
+        remove_stale_data_dirs(self.path, keep=self.data_dir)
+
+
+def check_format(path, manifest):
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ValueError(f'{path} uses an old column store layout; rebuild or re-ingest it.')
+
+
+def read_dictionary(data_path, manifest):
+    """Reads the committed part of a store's food name table."""
+    with open(os.path.join(data_path, DICT_FILE), 'rb') as f:
+        lines = f.read(manifest['dict_bytes']).decode('utf-8').split('\n')
+    return pd.Index(lines[:manifest['dict_size']], dtype='str')
+
+
+def _write_store(df, path, source=None, dtype=DEFAULT_DTYPE):
+    writer = StoreWriter.create(path, dtype=dtype, source=source)
+    writer.append(df)
+    writer.commit()
+
+
+def build_store(df, path, source=None, dtype=DEFAULT_DTYPE):
+    """Writes a DataFrame into a column store at ``path`` and returns the path."""
+    with store_lock(path):
+        _write_store(df, path, source=source, dtype=dtype)
+    return path
+
+
+def is_fresh(csv_path, path=None):
+    """Checks that a store exists and was built from the current CSV."""
+    path = path or store_path(csv_path)
+    try:
+        manifest = read_manifest(path)
+    except (OSError, ValueError):
+        return False
+    if manifest.get('format') != FORMAT_VERSION:
+        return False
+    source = manifest.get('source')
+    if source is None or not os.path.exists(csv_path):
+        # Ingested stores and stores without a CSV are their own source of truth.
+        return True
+    return source == source_fingerprint(csv_path)
+
+
+def ensure_store(csv_path, path=None):
+    """Opens the store for a CSV dataset, rebuilding it first if it is stale."""
+    path = path or store_path(csv_path)
+    if not is_fresh(csv_path, path):
+        with store_lock(path):
+            # Another process may have rebuilt it while this one waited
+            if not is_fresh(csv_path, path):
+                _write_store(read_dataset(csv_path), path, source=source_fingerprint(csv_path))
+    return ColumnStore(path)
+
+
+class ColumnStore:
+    """A read-only view over the memory-mapped columns of a store."""
+
+    def __init__(self, path):
+        self.path = path
+        self.manifest = read_manifest(path)
+        check_format(path, self.manifest)
+        self.rows = self.manifest['rows']
+        self._data_path = os.path.join(path, self.manifest['data_dir'])
+        self._dictionary = None
+
+    def _map(self, file_name, dtype):
+        if self.rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(self._data_path, file_name),
+                         dtype=dtype, mode='r', shape=(self.rows,))
+
+    def column(self, name):
+        """Returns a read-only memory map over one nutrient column."""
+        spec = self.manifest['columns'][name]
+        return self._map(spec['file'], spec['dtype'])
+
+    def food_codes(self):
+        """Returns a read-only memory map over the per-row food name codes."""
+        return self._map(CODES_FILE, CODES_DTYPE)
+
+    def food_dictionary(self):
+        """Returns the distinct food names, indexed by code."""
+        if self._dictionary is None:
+            self._dictionary = read_dictionary(self._data_path, self.manifest)
+        return self._dictionary
+
+    def stats(self):
+        """Returns the store's column statistics, computing and saving them if missing."""
+        stats = read_stats(self.path, self.manifest)
+        if stats is None:
+            # Stores committed before statistics were kept: one pass, then saved
+            stats = TableStats.from_frame(self.frame())
+            try:
+                write_stats(self.path, stats, self.manifest['data_dir'])
+            except OSError:
+                pass
+        return stats
+
+    def frame(self):
+        """Builds a DataFrame whose nutrient columns point at the mapped files."""
+        food = pd.Categorical.from_codes(
+            self.food_codes(), dtype=pd.CategoricalDtype(self.food_dictionary()))
+        data = {FOOD_COLUMN: food}
+        data.update({col: self.column(col) for col in self.manifest['columns']})
+        return pd.DataFrame(data, copy=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build memory-mapped column stores.')
+    parser.add_argument('csv', nargs='+', help='cleaned food CSV file(s)')
+    args = parser.parse_args(argv)
+    for csv_path in args.csv:
+        path = store_path(csv_path)
+        build_store(read_dataset(csv_path), path, source=source_fingerprint(csv_path))
+        print(f"{csv_path} -> {path} ({read_manifest(path)['rows']} rows)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""A small, safe filter language over the nutrient columns.
+
+Expressions such as::
+
+    Protein > 20 and Sodium < 0.5 and Sugars / Carbohydrates < 0.2
+    (Fat * 9 + Protein * 4) / [Caloric Value] >= 0.5
+    10 <= Dietary Fiber <= 20 or not Sugars > 5
+
+are tokenized and parsed by hand (nothing is ever passed to ``eval``) and
+compiled into a ``Plan``: a flat list of NumPy operations over numbered
+slots. Identical subexpressions are compiled once and their slot reused, so
+``Sugars / Carbohydrates`` appearing twice is divided once. A plan evaluates
+chunk by chunk, running every operation on one block of rows before moving
+on, which reads each column once and keeps temporaries small however many
+rows there are. Compiled plans are cached by expression text.
+
+Column names match case-insensitively, may contain spaces (the longest known
+name wins) and may be wrapped in ``[...]`` or backticks; underscores stand
+for spaces.
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from nutrichoice.schema import NUTRIENT_COLUMNS
+
+DEFAULT_CHUNK_ROWS = 1 << 20
+
+_NUMBER = re.compile(r'(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?')
+_QUOTED = re.compile(r'\[([^\]]+)\]|`([^`]+)`')
+_SYMBOLS = ['<=', '>=', '==', '!=', '<', '>', '+', '-', '*', '/', '(', ')']
+_KEYWORDS = {'and', 'or', 'not'}
+
+_ARITHMETIC = {'+': np.add, '-': np.subtract, '*': np.multiply, '/': np.divide}
+_COMPARISON = {'<': np.less, '<=': np.less_equal, '>': np.greater,
+               '>=': np.greater_equal, '==': np.equal, '!=': np.not_equal}
+
+
+class ExpressionError(ValueError):
+    """Raised for an expression that cannot be parsed or compiled."""
+
+
+def _word_end(text, at):
+    return at == len(text) or not (text[at].isalnum() or text[at] == '_')
+
+
+def tokenize(text, columns=NUTRIENT_COLUMNS):
+    """Splits an expression into ``(kind, value)`` tokens."""
+    names = sorted(columns, key=len, reverse=True)
+    folded = text.lower().replace('_', ' ')
+    tokens, at = [], 0
+    while at < len(text):
+        if text[at].isspace():
+            at += 1
+            continue
+        match = _QUOTED.match(text, at)
+        if match:
+            wanted = (match.group(1) or match.group(2)).strip().lower()
+            column = next((name for name in names if name.lower() == wanted), None)
+            if column is None:
+                raise ExpressionError(f'unknown column {match.group(0)}')
+            tokens.append(('column', column))
+            at = match.end()
+            continue
+        column = next((name for name in names if folded.startswith(name.lower(), at)
+                       and _word_end(text, at + len(name))), None)
+        if column is not None:
+            tokens.append(('column', column))
+            at += len(column)
+            continue
+        match = _NUMBER.match(text, at)
+        if match:
+            tokens.append(('number', float(match.group(0))))
+            at = match.end()
+            continue
+        word = re.match(r'[A-Za-z_]\w*', text[at:])
+        if word:
+            if word.group(0).lower() not in _KEYWORDS:
+                raise ExpressionError(f'unknown column {word.group(0)!r}')
+            tokens.append(('op', word.group(0).lower()))
+            at += len(word.group(0))
+            continue
+        symbol = next((s for s in _SYMBOLS if text.startswith(s, at)), None)
+        if symbol is None:
+            raise ExpressionError(f'unexpected {text[at]!r} at position {at}')
+        tokens.append(('op', symbol))
+        at += len(symbol)
+    return tokens
+
+
+class _Parser:
+    """Recursive descent into ``(op, *children)`` tuples, tagged with their type."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.at = 0
+
+    def peek(self):
+        return self.tokens[self.at] if self.at < len(self.tokens) else (None, None)
+
+    def accept(self, *ops):
+        kind, value = self.peek()
+        if kind == 'op' and value in ops:
+            self.at += 1
+            return value
+        return None
+
+    def parse(self):
+        if not self.tokens:
+            raise ExpressionError('empty expression')
+        node = self.disjunction()
+        if self.at < len(self.tokens):
+            raise ExpressionError(f'unexpected {self.peek()[1]!r}')
+        return node
+
+    def _logical(self, op, operand):
+        nodes = [operand()]
+        while self.accept(op):
+            nodes.append(operand())
+        node = nodes[0]
+        for other in nodes[1:]:
+            node = (op, _expect(node, 'bool', op), _expect(other, 'bool', op))
+        return node
+
+    def disjunction(self):
+        return self._logical('or', self.conjunction)
+
+    def conjunction(self):
+        return self._logical('and', self.negation)
+
+    def negation(self):
+        if self.accept('not'):
+            return ('not', _expect(self.negation(), 'bool', 'not'))
+        return self.comparison()
+
+    def comparison(self):
+        left = self.additive()
+        node = None
+        # Chains like ``10 <= Fiber <= 20`` mean both comparisons hold.
+        while True:
+            op = self.accept(*_COMPARISON)
+            if op is None:
+                break
+            right = self.additive()
+            test = (op, _expect(left, 'num', op), _expect(right, 'num', op))
+            node = test if node is None else ('and', node, test)
+            left = right
+        return left if node is None else node
+
+    def additive(self):
+        node = self.multiplicative()
+        while True:
+            op = self.accept('+', '-')
+            if op is None:
+                return node
+            node = (op, _expect(node, 'num', op), _expect(self.multiplicative(), 'num', op))
+
+    def multiplicative(self):
+        node = self.unary()
+        while True:
+            op = self.accept('*', '/')
+            if op is None:
+                return node
+            node = (op, _expect(node, 'num', op), _expect(self.unary(), 'num', op))
+
+    def unary(self):
+        if self.accept('-'):
+            return ('neg', _expect(self.unary(), 'num', '-'))
+        if self.accept('+'):
+            return _expect(self.unary(), 'num', '+')
+        if self.accept('('):
+            node = self.disjunction()
+            if not self.accept(')'):
+                raise ExpressionError('missing closing parenthesis')
+            return node
+        kind, value = self.peek()
+        if kind in ('column', 'number'):
+            self.at += 1
+            return (kind, value)
+        raise ExpressionError(f'unexpected {value!r}' if value is not None
+                              else 'unexpected end of expression')
+
+
+def _type(node):
+    return 'bool' if node[0] in _COMPARISON or node[0] in ('and', 'or', 'not') else 'num'
+
+
+def _expect(node, kind, op):
+    if _type(node) != kind:
+        wanted = 'a condition' if kind == 'bool' else 'a number'
+        raise ExpressionError(f'{op!r} needs {wanted}')
+    return node
+
+
+def parse(text, columns=NUTRIENT_COLUMNS):
+    """Parses an expression into a tree of ``(op, *children)`` tuples."""
+    node = _Parser(tokenize(text, columns)).parse()
+    if _type(node) != 'bool':
+        raise ExpressionError('the filter must be a comparison, e.g. Protein > 20')
+    return node
+
+
+class Plan:
+    """A compiled expression: NumPy steps over slots, last slot is the result."""
+
+    def __init__(self, tree):
+        self.steps = []
+        self.columns = []
+        self._slots = {}
+        self._emit(tree)
+
+    def _emit(self, node):
+        # Hash-consing: a subtree seen before reuses its slot.
+        slot = self._slots.get(node)
+        if slot is not None:
+            return slot
+        op = node[0]
+        if op == 'column' and node[1] not in self.columns:
+            self.columns.append(node[1])
+        args = node[1:] if op in ('column', 'number') else tuple(self._emit(child) for child in node[1:])
+        slot = self._slots[node] = len(self.steps)
+        self.steps.append((op, args))
+        return slot
+
+    def _run(self, values, start, stop):
+        # Conditions are kept as (true, false) masks; a row in neither is
+        # unknown because a missing value took part, as in SQL.
+        slots = []
+        for op, args in self.steps:
+            if op == 'column':
+                result = values[args[0]][start:stop]
+            elif op == 'number':
+                result = args[0]
+            elif op == 'neg':
+                result = np.negative(slots[args[0]])
+            elif op == 'not':
+                true, false = slots[args[0]]
+                result = false, true
+            elif op in _ARITHMETIC:
+                result = _ARITHMETIC[op](slots[args[0]], slots[args[1]])
+                # Division by zero and overflow give a missing value
+                result = np.where(np.isfinite(result), result, np.nan)
+            elif op in _COMPARISON:
+                left, right = slots[args[0]], slots[args[1]]
+                known = ~(np.isnan(left) | np.isnan(right))
+                holds = _COMPARISON[op](left, right)
+                result = holds & known, ~holds & known
+            elif op == 'and':
+                (true_a, false_a), (true_b, false_b) = slots[args[0]], slots[args[1]]
+                result = true_a & true_b, false_a | false_b
+            else:
+                (true_a, false_a), (true_b, false_b) = slots[args[0]], slots[args[1]]
+                result = true_a | true_b, false_a & false_b
+            slots.append(result)
+        return slots[-1][0]
+
+    def evaluate(self, values, length, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """Returns the boolean result for ``length`` rows.
+
+        ``values`` maps each of ``columns`` to an array of ``length`` values.
+        Arithmetic that divides by zero gives a missing value, and a
+        comparison involving a missing value is unknown: neither it nor its
+        ``not`` holds, and ``and``/``or`` follow SQL's three-valued logic.
+        """
+        out = np.empty(length, dtype=bool)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for start in range(0, length, chunk_rows):
+                stop = min(start + chunk_rows, length)
+                out[start:stop] = self._run(values, start, stop)
+        return out
+
+
+@lru_cache(maxsize=256)
+def _compile(text, columns):
+    return Plan(parse(text, columns))
+
+
+def compile_expression(text, columns=NUTRIENT_COLUMNS):
+    """Returns the (cached) ``Plan`` for an expression."""
+    return _compile(' '.join(text.split()), tuple(columns))
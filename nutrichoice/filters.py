@@ -0,0 +1,147 @@
+"""Index-backed filtering and copy-free row selections for the dashboard.
+
+``RangeIndex`` keeps, per nutrient, the permutation that sorts the column and
+the column values in that order. A ``low <= value <= high`` range is then two
+binary searches into the sorted values, and the rows it selects are a slice of
+the permutation, so a slider drag costs O(log n + k) for k rows instead of one
+full-length mask per bound. The query planner (see ``planner``) decides when
+that beats a scan and checks any further filters on those rows alone.
+
+``Selection`` carries the result through the rest of the page as row
+positions into the shared frame, so no filter step copies the dataset and
+each section gathers only the columns it actually plots.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class SortedColumn:
+    """One nutrient column with its sort permutation."""
+
+    def __init__(self, values):
+        values = np.asarray(values)
+        index_dtype = np.int32 if len(values) < np.iinfo(np.int32).max else np.int64
+        # NaNs sort to the end, past every finite bound, so they never match.
+        self.order = np.argsort(values).astype(index_dtype, copy=False)
+        self.sorted = values[self.order]
+
+    def __len__(self):
+        return len(self.sorted)
+
+    def bounds(self, low, high):
+        """Returns the ``[start, stop)`` slice of ``order`` inside the range."""
+        # Bounds take the column's dtype, as in a mask comparison; a Python
+        # float would make searchsorted upcast (copy) a float32 column.
+        scalar = self.sorted.dtype.type
+        start = np.searchsorted(self.sorted, scalar(low), side='left')
+        stop = np.searchsorted(self.sorted, scalar(high), side='right')
+        return int(start), int(max(stop, start))
+
+    def rows(self, low, high):
+        """Returns the row positions inside the range, in value order."""
+        start, stop = self.bounds(low, high)
+        return self.order[start:stop]
+
+
+class RangeIndex:
+    """Sorted columns for a frame, built lazily the first time each is queried."""
+
+    def __init__(self, df):
+        self._df = df
+        self._columns = {}
+        self._lock = threading.Lock()
+        self.rows = len(df)
+
+    def column(self, name):
+        sorted_column = self._columns.get(name)
+        if sorted_column is None:
+            with self._lock:
+                sorted_column = self._columns.get(name)
+                if sorted_column is None:
+                    sorted_column = self._columns[name] = SortedColumn(self.values(name))
+        return sorted_column
+
+    def values(self, name):
+        return self._df[name].to_numpy()
+
+
+class Selection:
+    """A set of rows of a shared frame, kept as positions instead of a copy.
+
+    Filters narrow the positions; sections then pull only the columns they
+    need through ``column`` or ``frame``. ``rows`` is ``None`` while every
+    row is selected, so the unfiltered dashboard never gathers anything.
+    """
+
+    def __init__(self, df, rows=None):
+        self.df = df
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.df) if self.rows is None else len(self.rows)
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    def positions(self):
+        return np.arange(len(self.df)) if self.rows is None else self.rows
+
+    def _take(self, values):
+        return values if self.rows is None else values[self.rows]
+
+    def restrict(self, keep):
+        """Narrows the selection to the rows where ``keep`` (one per row) is true."""
+        return Selection(self.df, self.positions()[np.asarray(keep, dtype=bool)])
+
+    def column(self, name):
+        """Returns the values of one column for the selected rows."""
+        return self._take(self.df[name].to_numpy())
+
+    def codes(self, name):
+        """Returns the categorical codes of one column for the selected rows."""
+        return self._take(self.df[name].cat.codes.to_numpy())
+
+    def frame(self, columns=None):
+        """Materializes ``columns`` (default: all) for the selected rows."""
+        columns = list(self.df.columns) if columns is None else list(columns)
+        positions = [self.df.columns.get_loc(col) for col in columns]
+        if self.rows is None:
+            return self.df.iloc[:, positions]
+        return self.df.iloc[self.rows, positions]
+
+    def matching(self, name, ids, ranked=False, leading=None):
+        """Keeps the rows whose categorical column ``name`` has one of the category ``ids``.
+
+        With ``ranked`` the rows are reordered to follow ``ids``, so the best
+        match of a ranked search comes first. ``leading`` instead puts only the
+        rows of those few ids first, in their order, and leaves the rest in
+        row order, so only the leading rows are sorted.
+        """
+        if ranked:
+            leading = ids
+        elif leading is None:
+            leading = ()
+        size = len(self.df[name].cat.categories)
+        codes = self.codes(name)
+        matched = np.zeros(size + 1, dtype=bool)
+        matched[ids] = True
+        keep = matched[codes]  # code -1 reads the trailing False
+        if not len(leading):
+            return self.restrict(keep)
+        rank = np.full(size + 1, -1, dtype=np.int64)
+        rank[leading] = np.arange(len(leading))
+        row_rank = rank[codes]
+        positions = self.positions()
+        lead = row_rank >= 0
+        first = positions[lead][np.argsort(row_rank[lead], kind='stable')]
+        return Selection(self.df, np.concatenate([first, positions[keep & ~lead]]))
+
+    def nunique(self, name):
+        """Counts the distinct values of a column among the selected rows."""
+        if isinstance(self.df[name].dtype, pd.CategoricalDtype):
+            codes = self.codes(name)
+            return int(np.count_nonzero(np.bincount(codes[codes >= 0])))
+        return pd.Series(self.column(name)).nunique()
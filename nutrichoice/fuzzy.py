@@ -0,0 +1,138 @@
+"""Typo-tolerant search over the words of the food names.
+
+``FuzzyIndex`` is a symmetric-delete index: every vocabulary word is stored
+under each string obtained by deleting up to ``max_distance`` of its
+characters. Two words within that edit distance always share one of those
+delete strings, so a misspelt query word only has to generate its own deletes
+and look them up, and the few words found are confirmed with a real edit
+distance. Lookup cost depends on the length of the query word, not on the
+size of the vocabulary.
+
+As in SymSpell, only the first ``prefix_length`` characters of a word are
+used for the deletes, which keeps the index small at the cost of missing a
+few matches whose typos fall at the very start of long words.
+"""
+import numpy as np
+
+from nutrichoice.tokens import tokenize
+
+DEFAULT_MAX_DISTANCE = 2
+DEFAULT_PREFIX_LENGTH = 7
+
+
+def edit_distance(a, b, limit=None):
+    """Levenshtein distance counting an adjacent transposition as one edit.
+
+    Stops early and returns ``limit + 1`` once the distance exceeds ``limit``.
+    """
+    if limit is not None and abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def deletes(word, distance):
+    """Returns ``word`` and every string made by deleting up to ``distance`` characters."""
+    found = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - found
+        found |= frontier
+    return found
+
+
+def allowed_distance(word, max_distance=DEFAULT_MAX_DISTANCE):
+    """Edit budget for a query word: none for very short words, more for longer ones."""
+    if len(word) < 3:
+        return 0
+    return min(max_distance, 1 if len(word) < 6 else 2)
+
+
+class FuzzyIndex:
+    """Symmetric-delete index over the vocabulary of a ``TokenIndex``."""
+
+    def __init__(self, tokens, max_distance=DEFAULT_MAX_DISTANCE,
+                 prefix_length=DEFAULT_PREFIX_LENGTH):
+        self.tokens = tokens
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self._deletes = {}
+        for word_id, word in enumerate(tokens.words):
+            for key in deletes(word[:prefix_length], max_distance):
+                self._deletes.setdefault(key, []).append(word_id)
+
+    def lookup(self, word, max_distance=None):
+        """Returns ``(distance, word_id)`` pairs for the vocabulary words near ``word``.
+
+        Closest words come first, and among equally close words the ones found
+        in more names.
+        """
+        if max_distance is None:
+            max_distance = allowed_distance(word, self.max_distance)
+        max_distance = min(max_distance, self.max_distance)
+        words = self.tokens.words
+        seen, matches = set(), []
+        for key in deletes(word[:self.prefix_length], max_distance):
+            for word_id in self._deletes.get(key, ()):
+                if word_id in seen:
+                    continue
+                seen.add(word_id)
+                distance = edit_distance(word, words[word_id], max_distance)
+                if distance <= max_distance:
+                    matches.append((distance, word_id))
+        doc_freq = self.tokens.doc_freq
+        matches.sort(key=lambda match: (match[0], -doc_freq[match[1]], words[match[1]]))
+        return matches
+
+    def search(self, query):
+        """Returns the ids of the names matching every query word, best first.
+
+        Each query word may match any vocabulary word within its edit budget;
+        a name's score is the sum of the smallest distance found for each
+        query word. Returns ``(ids, scores)`` sorted by score, then by id.
+        """
+        words = tokenize(query)
+        names = len(self.tokens)
+        if not words:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        missing = self.max_distance + 1
+        total = np.zeros(names, dtype=np.int64)
+        found = np.ones(names, dtype=bool)
+        for word in words:
+            best = np.full(names, missing, dtype=np.int64)
+            for distance, word_id in self.lookup(word):
+                posting = self.tokens.posting(word_id)
+                best[posting] = np.minimum(best[posting], distance)
+            total += best
+            # A name missing any query word cannot come back.
+            found &= best < missing
+            if not found.any():
+                break
+        ids = np.flatnonzero(found)
+        order = np.lexsort((ids, total[ids]))
+        return ids[order], total[ids][order]
+
+    def suggest(self, query):
+        """Returns the query with each unknown word replaced by its closest match.
+
+        Returns ``None`` when every word is already known or nothing close is.
+        """
+        words = tokenize(query)
+        corrected = []
+        for word in words:
+            if self.tokens.word_id(word) is None:
+                matches = self.lookup(word)
+                if matches:
+                    word = self.tokens.words[matches[0][1]]
+            corrected.append(word)
+        return ' '.join(corrected) if corrected != words else None
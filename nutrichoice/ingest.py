@@ -0,0 +1,108 @@
+"""Streaming ingest of large CSV/TSV food exports into a column store.
+
+``pd.read_csv`` on a full catalogue needs the whole file, and every inferred
+object column, in memory at once. Here the export is read ``chunksize`` rows
+at a time, only the columns the dashboard uses are parsed, nutrients are cast
+straight to a compact dtype, and each chunk is appended to the column store
+and committed before the next one is read. Peak memory is bounded by the
+chunk size, not by the size of the file.
+
+Usage::
+
+    python -m nutrichoice.ingest catalogue.tsv --store FOOD-CATALOGUE.columns
+    python -m nutrichoice.ingest more.csv --store FOOD-CATALOGUE.columns --append
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+from nutrichoice.colstore import StoreWriter, read_manifest, store_lock
+from nutrichoice.schema import COLUMNS, FOOD_COLUMN, NUTRIENT_COLUMNS
+
+DEFAULT_CHUNKSIZE = 100_000
+COMPACT_DTYPE = 'float32'
+
+
+def detect_separator(path):
+    """Guesses the field separator from the file extension."""
+    ext = os.path.splitext(path)[1].lower()
+    return '\t' if ext in ('.tsv', '.tab') else ','
+
+
+def iter_chunks(source, chunksize=DEFAULT_CHUNKSIZE, sep=None, dtype=COMPACT_DTYPE):
+    """Yields ``(chunk, bytes_read)`` pairs of projected, typed rows."""
+    sep = sep or detect_separator(source)
+    dtypes = {FOOD_COLUMN: 'str', **{col: dtype for col in NUTRIENT_COLUMNS}}
+    with open(source, 'rb') as f:
+        reader = pd.read_csv(f, sep=sep, usecols=COLUMNS, dtype=dtypes,
+                             chunksize=chunksize)
+        for chunk in reader:
+            yield chunk[COLUMNS], f.tell()
+
+
+def ingest(source, store, chunksize=DEFAULT_CHUNKSIZE, sep=None, append=False,
+           dtype=COMPACT_DTYPE, progress=None):
+    """Streams ``source`` into the column store at ``store``.
+
+    Without ``append`` the rows go into a new data directory that replaces the
+    store's contents once the whole file has been read. With ``append`` they
+    are added to the existing store, which is committed after every chunk so
+    readers see the ingest advance. ``progress`` is called as
+    ``progress(rows, bytes_read, total_bytes)`` after each chunk.
+
+    Returns the number of rows ingested. Other writers of the store wait
+    until the ingest is done.
+    """
+    with store_lock(store):
+        if append and os.path.exists(os.path.join(store, 'manifest.json')):
+            writer = StoreWriter.open(store)
+            # Parse straight into the dtypes the store already uses.
+            dtype = read_manifest(store)['columns'][NUTRIENT_COLUMNS[0]]['dtype']
+        else:
+            append = False
+            writer = StoreWriter.create(store, dtype=dtype)
+
+        total_bytes = os.path.getsize(source)
+        ingested = 0
+        for chunk, bytes_read in iter_chunks(source, chunksize=chunksize, sep=sep, dtype=dtype):
+            writer.append(chunk)
+            ingested += len(chunk)
+            if append:
+                writer.commit()
+            if progress:
+                progress(ingested, bytes_read, total_bytes)
+        writer.commit()
+    return ingested
+
+
+def _report_progress(started):
+    def report(rows, bytes_read, total_bytes):
+        elapsed = max(time.monotonic() - started, 1e-9)
+        percent = 100.0 * bytes_read / total_bytes if total_bytes else 100.0
+        sys.stderr.write(f'\r{percent:5.1f}%  {rows:,} rows  {rows / elapsed:,.0f} rows/s')
+        sys.stderr.flush()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stream a food CSV/TSV export into a column store.')
+    parser.add_argument('source', help='CSV or TSV export to ingest')
+    parser.add_argument('--store', required=True, help='column store directory')
+    parser.add_argument('--append', action='store_true', help='append to an existing store')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help='rows per chunk')
+    parser.add_argument('--sep', help='field separator (default: from the file extension)')
+    parser.add_argument('--dtype', default=COMPACT_DTYPE, help='dtype of a new store')
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    rows = ingest(args.source, args.store, chunksize=args.chunksize, sep=args.sep,
+                  append=args.append, dtype=args.dtype, progress=_report_progress(started))
+    sys.stderr.write('\n')
+    print(f'{args.source} -> {args.store} ({rows:,} rows in {time.monotonic() - started:.1f}s)')
+
+
+if __name__ == '__main__':
+    main()
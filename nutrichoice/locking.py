@@ -0,0 +1,48 @@
+"""Exclusive, cross-process file locks for the writers of on-disk data.
+
+A lock is an advisory lock on a small lock file: ``flock`` on POSIX and
+``msvcrt.locking`` on Windows. It is released when the holder leaves the
+``with`` block or dies, so a crashed writer never leaves it held. Locks are
+per open file, so they also exclude threads of the same process, but they
+are not reentrant.
+"""
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _lock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            # Retries for about ten seconds before giving up; keep waiting
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(lock_path):
+    """Holds an exclusive lock on ``lock_path`` (created if missing), waiting for it."""
+    with open(lock_path, 'a+b') as f:
+        _lock(f)
+        try:
+            yield
+        finally:
+            _unlock(f)
@@ -0,0 +1,282 @@
+"""Cost-based choice of how to answer the range, group and preset filters.
+
+The same filters can be answered several ways: one sequential pass with
+masks, binary searches in a presorted column followed by checks on the rows
+found, the zone index, or word-wise operations on bitmaps. Which is cheapest
+depends on how many rows each filter keeps: a wide calorie range keeps nearly
+everything and is cheapest as a mask, while a narrow protein range is
+cheapest through its sorted column.
+
+``Statistics`` collects an equi-depth histogram per nutrient (and the row
+count of every food group) once per dataset, either from the rows or from
+the percentiles saved with the data. ``plan`` uses them to estimate
+the selectivity of each predicate, drops predicates that cannot exclude a
+row, orders the rest most selective first, costs every access path and picks
+the cheapest. Costs are rough counts of values touched: a value read in
+column order costs 1 and a value read through row positions ``GATHER_COST``,
+and rows combined assume the predicates are independent.
+"""
+import math
+
+import numpy as np
+
+from nutrichoice.colstats import PERCENTILES
+from nutrichoice.presets import DIET_PRESETS, combine_ranges
+from nutrichoice.registry import GROUP_COLUMN
+from nutrichoice.schema import NUTRIENT_COLUMNS
+from nutrichoice.zone_index import SCAN_FRACTION
+
+DEFAULT_BUCKETS = 64
+# Histograms of longer columns are built from a random sample of this many
+# values (plus the exact min and max), which keeps estimates within about a
+# percent at a fraction of the cost of a full sort.
+SAMPLE_SIZE = 1 << 17
+GATHER_COST = 4
+# Only this many ranges or more are worth the zone index's per-leaf checks.
+ZONE_MIN_RANGES = 3
+
+
+class Histogram:
+    """Equi-depth histogram: ``bounds`` split the non-missing values into equal counts."""
+
+    def __init__(self, values, buckets=DEFAULT_BUCKETS, sample_size=SAMPLE_SIZE):
+        values = np.asarray(values)
+        valid = values[~np.isnan(values)]
+        self.rows = len(values)
+        self.nulls = self.rows - len(valid)
+        if not len(valid):
+            self.bounds = np.empty(0)
+            return
+        sample = valid
+        if len(valid) > sample_size:
+            sample = valid[np.random.default_rng(0).integers(0, len(valid), sample_size)]
+        self.bounds = np.quantile(sample, np.linspace(0, 1, buckets + 1))
+        self.bounds[0], self.bounds[-1] = valid.min(), valid.max()
+
+    @classmethod
+    def from_column_stats(cls, stats, rows, buckets=DEFAULT_BUCKETS):
+        """Reads the histogram off a column's saved percentiles, without the values."""
+        histogram = cls.__new__(cls)
+        histogram.rows = rows
+        histogram.nulls = rows - stats.count
+        histogram.bounds = np.empty(0)
+        if stats.percentiles is not None:
+            histogram.bounds = np.interp(np.linspace(0, 1, buckets + 1), PERCENTILES, stats.percentiles)
+            histogram.bounds[0], histogram.bounds[-1] = stats.min, stats.max
+        return histogram
+
+    def _cdf(self, x, side):
+        # Share of the non-missing values below x ('left') or up to x ('right'),
+        # interpolated linearly inside the bucket holding x.
+        bounds = self.bounds
+        i = int(np.searchsorted(bounds, x, side=side))
+        if i == 0:
+            return 0.0
+        if i >= len(bounds):
+            return 1.0
+        low, high = bounds[i - 1], bounds[i]
+        within = (x - low) / (high - low) if high > low else 0.0
+        return (i - 1 + within) / (len(bounds) - 1)
+
+    def fraction(self, low, high):
+        """Estimated share of all rows with a value in ``[low, high]``."""
+        if not len(self.bounds) or low > high:
+            return 0.0
+        share = max(self._cdf(high, 'right') - self._cdf(low, 'left'), 0.0)
+        return share * (self.rows - self.nulls) / self.rows
+
+    def covers(self, low, high):
+        """True if every row lies in ``[low, high]``, so the range excludes nothing."""
+        return (not self.nulls and len(self.bounds) > 0
+                and low <= self.bounds[0] and high >= self.bounds[-1])
+
+
+class Statistics:
+    """Per-dataset inputs of the planner: row count, histograms and group sizes."""
+
+    def __init__(self, rows, histograms, groups=None):
+        self.rows = rows
+        self.histograms = histograms
+        self.groups = groups or {}
+
+    @classmethod
+    def from_frame(cls, df, columns=NUTRIENT_COLUMNS, buckets=DEFAULT_BUCKETS):
+        """Builds the histograms from the rows of ``df``."""
+        histograms = {col: Histogram(df[col].to_numpy(), buckets)
+                      for col in columns if col in df.columns}
+        groups = (df[GROUP_COLUMN].value_counts().to_dict()
+                  if GROUP_COLUMN in df.columns else {})
+        return cls(len(df), histograms, groups)
+
+    @classmethod
+    def from_table_stats(cls, stats, columns=NUTRIENT_COLUMNS, buckets=DEFAULT_BUCKETS):
+        """Builds the histograms from saved column statistics (see ``colstats``)."""
+        histograms = {col: Histogram.from_column_stats(stats[col], stats.rows, buckets)
+                      for col in columns if col in stats.columns}
+        return cls(stats.rows, histograms, stats.groups)
+
+
+class Predicate:
+    """One filter: a column range, or for ``GROUP_COLUMN`` a set of groups."""
+
+    def __init__(self, column, low=None, high=None, values=None, selectivity=1.0):
+        self.column = column
+        self.low, self.high = low, high
+        self.values = values
+        self.selectivity = selectivity
+
+    @property
+    def is_range(self):
+        return self.values is None
+
+    def mask(self, df, rows=None):
+        """Tests the predicate on ``rows`` (default: every row) of ``df``."""
+        if self.is_range:
+            values = df[self.column].to_numpy()
+            values = values if rows is None else values[rows]
+            return (values >= self.low) & (values <= self.high)
+        codes = df[self.column].cat.codes.to_numpy()
+        codes = codes if rows is None else codes[rows]
+        return df[self.column].cat.categories.isin(self.values)[codes] & (codes >= 0)
+
+    def __str__(self):
+        if self.is_range:
+            return f'{self.column} BETWEEN {self.low:g} AND {self.high:g}'
+        return f'{self.column} IN ({", ".join(map(str, self.values))})'
+
+
+class Plan:
+    """The chosen access path, the predicates in evaluation order and the cost estimates."""
+
+    def __init__(self, path, predicates, rows, estimate, costs, ranges=None, groups=None, presets=()):
+        self.path = path
+        self.predicates = predicates
+        self.rows = rows
+        self.estimate = estimate
+        self.costs = costs
+        # The filters as given (minus ranges that exclude nothing), for the
+        # bitmap index's precomputed presets
+        self.ranges, self.groups, self.presets = ranges or {}, groups, presets
+
+    def explain(self):
+        """A readable description of the plan, one line per step."""
+        lines = [f'access path: {self.path} (estimated {self.estimate:,.0f} of {self.rows:,} rows)']
+        for number, predicate in enumerate(self.predicates, 1):
+            lines.append(f'  {number}. {predicate}  [selectivity {predicate.selectivity:.2%}]')
+        if not self.predicates:
+            lines.append('  no predicate excludes any row')
+        if self.costs:
+            lines.append('costs: ' + ', '.join(f'{path}={cost:,.0f}' for path, cost in
+                                               sorted(self.costs.items(), key=lambda item: item[1])))
+        return '\n'.join(lines)
+
+
+def _predicates(stats, ranges, groups):
+    predicates = []
+    for col, (low, high) in ranges.items():
+        histogram = stats.histograms.get(col)
+        if histogram is None or not histogram.covers(low, high):
+            predicates.append(Predicate(col, low, high, selectivity=_fraction(stats, col, low, high)))
+    if groups is not None and stats.groups and set(stats.groups) - set(groups):
+        kept = sum(stats.groups.get(group, 0) for group in groups)
+        predicates.append(Predicate(GROUP_COLUMN, values=tuple(groups),
+                                    selectivity=kept / max(stats.rows, 1)))
+    predicates.sort(key=lambda p: p.selectivity)
+    return predicates
+
+
+def _fraction(stats, col, low, high):
+    histogram = stats.histograms.get(col)
+    return histogram.fraction(low, high) if histogram is not None else 1.0
+
+
+def _refine_cost(rows, predicates):
+    # Each later predicate gathers the values of the rows still left.
+    cost, left = 0.0, rows
+    for predicate in predicates:
+        cost += GATHER_COST * left
+        left *= predicate.selectivity
+    return cost
+
+
+def scan_gathers(share):
+    """True once the ``share`` of rows left by a scan is small enough that
+    gathering their values beats comparing a whole column."""
+    return GATHER_COST * share < 1
+
+
+def _sort_cost(rows):
+    return rows * math.log2(rows + 1)
+
+
+def plan(stats, ranges, groups=None, presets=(), zone=None, bitmap_buckets=None, backend=False):
+    """Chooses how to evaluate ranges, groups and presets; returns a ``Plan``.
+
+    ``zone`` (a function returning the ``ZoneIndex``, called only when enough
+    ranges are left for it to matter) and ``bitmap_buckets`` (the bucket count
+    of the ``BitmapIndex``) make those access paths candidates. With
+    ``backend`` the filters all go to the SQLite backend and the plan only
+    describes them.
+    """
+    n = stats.rows
+    ranges = {col: bounds for col, bounds in ranges.items()
+              if col not in stats.histograms or not stats.histograms[col].covers(*bounds)}
+    combined = combine_ranges(ranges, *(DIET_PRESETS[name] for name in presets))
+    predicates = _predicates(stats, combined, groups)
+    estimate = n * np.prod([p.selectivity for p in predicates]) if predicates else n
+
+    # Groups stay only if they exclude a row
+    groups = groups if any(not p.is_range for p in predicates) else None
+
+    def build(path, order, costs):
+        return Plan(path, order, n, estimate, costs, ranges, groups, presets)
+
+    if backend:
+        return build('backend', predicates, {})
+    if not predicates:
+        return build('all', predicates, {})
+
+    # A scan masks whole columns while most rows are left, then gathers
+    scan, left = 0.0, float(n)
+    for predicate in predicates:
+        scan += GATHER_COST * left if scan_gathers(left / max(n, 1)) else n
+        left *= predicate.selectivity
+    costs = {'scan': scan + n}
+    order = {'scan': predicates}
+
+    range_predicates = [p for p in predicates if p.is_range]
+    if range_predicates:
+        # The most selective range drives binary searches; the rest check its rows
+        driver = range_predicates[0]
+        rest = [p for p in predicates if p is not driver]
+        found = n * driver.selectivity
+        costs['range'] = found + _refine_cost(found, rest) + _sort_cost(estimate)
+        order['range'] = [driver] + rest
+
+    if zone is not None and len(range_predicates) >= ZONE_MIN_RANGES:
+        zone_index = zone()
+        inside, partial = zone_index.touched({p.column: (p.low, p.high) for p in range_predicates})
+        groups_left = [p for p in predicates if not p.is_range]
+        if partial > SCAN_FRACTION * n:
+            # The zone index itself falls back to a pass with masks
+            found = n * len(range_predicates)
+        else:
+            found = inside + _refine_cost(partial, range_predicates) + _sort_cost(estimate)
+        selectivity = np.prod([p.selectivity for p in range_predicates])
+        costs['zone'] = (zone_index.leaves * len(range_predicates) + found
+                         + _refine_cost(n * selectivity, groups_left))
+        order['zone'] = range_predicates + groups_left
+
+    if bitmap_buckets:
+        words = n / 64
+        bucket_rows = n / bitmap_buckets
+        bitmaps = len(presets) + (len(groups) if groups is not None else 0)
+        costs['bitmap'] = (words * bitmaps
+                           + sum(words * _fraction(stats, col, low, high) * bitmap_buckets
+                                 + 2 * GATHER_COST * bucket_rows
+                                 for col, (low, high) in ranges.items())
+                           + 2 * n)  # unpacking the result into positions
+        order['bitmap'] = predicates
+
+    path = min(costs, key=costs.get)
+    return build(path, order[path], costs)
@@ -0,0 +1,28 @@
+"""Diet presets: named sets of per-serving nutrient bounds.
+
+Each preset maps nutrient columns to inclusive ``(low, high)`` bounds, the
+same shape the range filters use, so a preset can be handed to any backend as
+extra ranges or precomputed as a bitmap by ``bitmap.BitmapIndex``.
+"""
+import math
+
+DIET_PRESETS = {
+    'High protein': {'Protein': (20.0, math.inf)},
+    'Low carb': {'Carbohydrates': (-math.inf, 10.0)},
+    'Low fat': {'Fat': (-math.inf, 3.0)},
+    'Low sugar': {'Sugars': (-math.inf, 5.0)},
+    'Low sodium': {'Sodium': (-math.inf, 0.14)},
+    'High fiber': {'Dietary Fiber': (5.0, math.inf)},
+}
+
+
+def combine_ranges(*range_sets):
+    """Intersects several ``{column: (low, high)}`` mappings into one."""
+    combined = {}
+    for ranges in range_sets:
+        for col, (low, high) in ranges.items():
+            if col in combined:
+                old_low, old_high = combined[col]
+                low, high = max(low, old_low), min(high, old_high)
+            combined[col] = (low, high)
+    return combined
@@ -0,0 +1,411 @@
+"""Lazy, chainable queries over the food catalogue.
+
+A ``Catalog`` wraps the shared frame together with the indexes that can
+answer predicates. Queries are built by chaining and run only on ``execute``::
+
+    result = (Catalog(df)
+              .filter({'Protein': (20, 60)}, presets=['Low sugar'])
+              .search('chicken')
+              .top_k('Protein', 10)
+              .agg(avg_fat=('Fat', 'mean'), foods=('food', 'nunique'))
+              .execute())
+
+Each call returns a new ``Query`` that only records what was asked. At
+execution the accumulated filters are merged and handed to the cost-based
+planner (see ``planner``), which picks one access path: the SQLite backend, a
+sequential scan, the sorted range index, the zone index or the bitmap index.
+Expressions and searches then narrow the resulting row positions, and only
+then are columns read: each column that an aggregate or top-K list refers to
+is gathered once for the selected rows and shared by all of them, and the
+other columns of a top-K list are read for its ``n`` rows only. When the
+filters come down to a single range, sums, counts and means are read off the
+prefix sums of ``aggregate_index`` instead.
+"""
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from nutrichoice.aggregate_index import PREFIX_AGGREGATES, AggregateIndex
+from nutrichoice.analysis import analyze
+from nutrichoice import planner
+from nutrichoice.bitmap import DEFAULT_BUCKETS, BitmapIndex, count
+from nutrichoice.bm25 import BM25Index, QueryError, top_k
+from nutrichoice.expressions import ExpressionError, compile_expression
+from nutrichoice.filters import RangeIndex, Selection
+from nutrichoice.fuzzy import FuzzyIndex
+from nutrichoice.presets import DIET_PRESETS, combine_ranges
+from nutrichoice.registry import GROUP_COLUMN
+from nutrichoice.schema import FOOD_COLUMN
+from nutrichoice.tokens import TokenIndex
+from nutrichoice.topk import top_rows
+from nutrichoice.trigram import TrigramIndex
+from nutrichoice.zone_index import ZoneIndex
+
+SEARCH_MODES = ('substring', 'ranked', 'fuzzy', 'regex')
+
+# Aggregates follow ``Selection``: NaNs are skipped, an empty sum or count is
+# 0 and an empty mean, min or max is NaN.
+AGGREGATES = {
+    'sum': lambda values: float(np.nansum(values)) if len(values) else 0.0,
+    'mean': lambda values: float(np.nanmean(values)) if len(values) else np.nan,
+    'min': lambda values: float(np.nanmin(values)) if len(values) else np.nan,
+    'max': lambda values: float(np.nanmax(values)) if len(values) else np.nan,
+    'count': lambda values: int(np.count_nonzero(~pd.isna(values))),
+}
+
+
+def _names(df):
+    return df[FOOD_COLUMN].cat.categories
+
+
+# How each index is built from the catalogue when no loader is supplied.
+_BUILDERS = {
+    'range': lambda catalog: RangeIndex(catalog.df),
+    'aggregates': lambda catalog: AggregateIndex(catalog.index('range')),
+    'bitmap': lambda catalog: BitmapIndex(
+        catalog.df, range_index=catalog.index('range'),
+        categorical=[GROUP_COLUMN] if GROUP_COLUMN in catalog.df.columns else []),
+    'zone': lambda catalog: ZoneIndex(catalog.df),
+    'names': lambda catalog: TrigramIndex(_names(catalog.df)),
+    'terms': lambda catalog: TokenIndex(_names(catalog.df), analyze=analyze),
+    'ranked': lambda catalog: BM25Index(catalog.index('terms')),
+    'fuzzy': lambda catalog: FuzzyIndex(TokenIndex(_names(catalog.df))),
+    'stats': lambda catalog: planner.Statistics.from_frame(catalog.df),
+    'backend': lambda catalog: None,
+}
+
+
+class Catalog:
+    """The shared frame and the indexes queries push their predicates into.
+
+    ``indexes`` maps index names (see ``_BUILDERS``) to zero-argument loaders,
+    so an application can hand in indexes it already caches; the rest are
+    built from the frame on first use. A ``'backend'`` loader (an
+    ``SQLiteBackend``) makes queries push filters into SQL instead.
+    ``signature`` identifies the data in query keys.
+    """
+
+    def __init__(self, df, indexes=None, signature=None):
+        self.df = df
+        self.signature = signature
+        self._loaders = dict(indexes or {})
+        self._indexes = {}
+        self._lock = threading.RLock()
+
+    def index(self, name):
+        """Returns the named index, loading or building it once."""
+        if name not in self._indexes:
+            with self._lock:
+                if name not in self._indexes:
+                    loader = self._loaders.get(name)
+                    self._indexes[name] = loader() if loader else _BUILDERS[name](self)
+        return self._indexes[name]
+
+    @property
+    def backend(self):
+        return self.index('backend')
+
+    def query(self):
+        return Query(self)
+
+    def filter(self, *args, **kwargs):
+        return self.query().filter(*args, **kwargs)
+
+    def search(self, *args, **kwargs):
+        return self.query().search(*args, **kwargs)
+
+
+class Result:
+    """What an executed query produced.
+
+    ``selection`` holds the matching rows (in search rank order for ranked and
+    fuzzy searches), ``count`` their number, ``aggregates`` and ``top`` the
+    values and frames asked for by name, ``warnings`` any parse errors of a
+    search or expression (which then did not filter) and ``plan`` the
+    ``planner.Plan`` the filters followed.
+    """
+
+    def __init__(self, selection, count, aggregates, top, warnings, plan):
+        self.selection = selection
+        self.count = count
+        self.aggregates = aggregates
+        self.top = top
+        self.warnings = warnings
+        self.plan = plan
+
+
+class Query:
+    """An immutable description of filters, a search and outputs over a catalogue."""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.ranges = {}
+        self.groups = None
+        self.presets = ()
+        self.expressions = ()
+        self.term = None
+        self.mode = None
+        self.lead = 0
+        self.tops = {}
+        self.aggregates = {}
+
+    def _with(self, **changes):
+        query = Query.__new__(Query)
+        query.__dict__.update(self.__dict__, **changes)
+        return query
+
+    def filter(self, ranges=None, groups=None, presets=(), expression=None):
+        """Adds predicates; every predicate of every call must hold.
+
+        ``ranges`` maps columns to inclusive ``(low, high)`` bounds, ``groups``
+        lists the food groups to keep, ``presets`` names entries of
+        ``DIET_PRESETS`` and ``expression`` is a filter expression (see
+        ``expressions``).
+        """
+        changes = {'ranges': combine_ranges(self.ranges, ranges or {})}
+        if groups is not None:
+            groups = tuple(groups)
+            if self.groups is not None:
+                groups = tuple(group for group in groups if group in self.groups)
+            changes['groups'] = groups
+        if presets:
+            changes['presets'] = self.presets + tuple(p for p in presets if p not in self.presets)
+        if expression and expression.strip():
+            changes['expressions'] = self.expressions + (' '.join(expression.split()),)
+        return self._with(**changes)
+
+    def search(self, term, mode='substring', lead=0):
+        """Keeps the rows whose food name matches ``term`` (replacing any earlier search).
+
+        ``mode`` is one of ``SEARCH_MODES``. Ranked and fuzzy searches order
+        the rows by match quality; a ranked search puts the names of its
+        ``lead`` best scores first and the rest of the matches after them.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f'unknown search mode {mode!r}')
+        if not term:
+            return self._with(term=None, mode=None, lead=0)
+        return self._with(term=term, mode=mode, lead=lead)
+
+    def top_k(self, column, n, columns=None, name=None):
+        """Asks for the ``n`` rows with the largest ``column`` values, as a frame.
+
+        The frame holds ``columns`` (default: the food name and ``column``) and
+        is stored under ``name`` (default: ``column``) in ``Result.top``.
+        """
+        columns = tuple(columns) if columns is not None else (FOOD_COLUMN, column)
+        return self._with(tops={**self.tops, name or column: (column, n, columns)})
+
+    def agg(self, **named):
+        """Asks for aggregates given as ``name=(column, function)``.
+
+        Functions are the keys of ``AGGREGATES`` plus ``'nunique'``.
+        """
+        for name, (column, func) in named.items():
+            if func not in AGGREGATES and func != 'nunique':
+                raise ValueError(f'unknown aggregate {func!r} for {name}')
+        return self._with(aggregates={**self.aggregates, **named})
+
+    def filter_key(self):
+        """A hashable key of the catalogue and the filters (not the search)."""
+        return (self.catalog.signature, tuple(self.ranges.items()), self.groups,
+                self.presets, self.expressions)
+
+    # --- Execution ---
+
+    def _filter_groups(self):
+        df = self.catalog.df
+        return self.groups if self.groups is not None and GROUP_COLUMN in df.columns else None
+
+    def plan(self):
+        """Returns the ``planner.Plan`` chosen for the filters of this query."""
+        catalog = self.catalog
+        return planner.plan(
+            catalog.index('stats'), self.ranges, groups=self._filter_groups(), presets=self.presets,
+            zone=lambda: catalog.index('zone'), bitmap_buckets=DEFAULT_BUCKETS,
+            backend=catalog.backend is not None
+        )
+
+    def explain(self):
+        """Describes the access path and predicate order the filters would use."""
+        return self.plan().explain()
+
+    def _indexed(self, plan):
+        """Evaluates the filters along the planned access path.
+
+        Returns the selection and, when the bitmap index counted it for free, its size.
+        """
+        catalog = self.catalog
+        df = catalog.df
+        if plan.path == 'all':
+            return Selection(df), None
+        if plan.path == 'bitmap':
+            # Group and preset bitmaps are precomputed; ranges OR whole buckets
+            # and refine only the edges, then one word-wise AND
+            bitmap_index = catalog.index('bitmap')
+            bits = bitmap_index.select(
+                plan.ranges,
+                categories={GROUP_COLUMN: list(plan.groups)} if plan.groups is not None else None,
+                presets=list(plan.presets)
+            )
+            return Selection(df, bitmap_index.positions(bits)), count(bits)
+        predicates = plan.predicates
+        if plan.path == 'zone':
+            # Prune whole leaves of the zone index by every range at once
+            ranged = [p for p in predicates if p.is_range]
+            rows = catalog.index('zone').select({p.column: (p.low, p.high) for p in ranged})
+            rows = np.arange(len(df)) if rows is None else rows
+            rest = predicates[len(ranged):]
+        elif plan.path == 'range':
+            # Binary searches in the presorted column of the most selective range
+            driver = predicates[0]
+            rows = catalog.index('range').column(driver.column).rows(driver.low, driver.high)
+            rest = predicates[1:]
+        else:
+            # Sequential passes, most selective predicate first, while most rows are left
+            keep, rest = predicates[0].mask(df), predicates[1:]
+            share = predicates[0].selectivity
+            while rest and not planner.scan_gathers(share):
+                keep &= rest[0].mask(df)
+                share *= rest[0].selectivity
+                rest = rest[1:]
+            rows = np.flatnonzero(keep)
+        # Later predicates only check the rows still left
+        for predicate in rest:
+            if not len(rows):
+                break
+            rows = rows[predicate.mask(df, rows)]
+        if plan.path == 'range':
+            rows = np.sort(rows)
+        return Selection(df, rows), None
+
+    def _backend_select(self, backend):
+        """Pushes ranges, groups, presets and a substring search into one SQL query."""
+        catalog = self.catalog
+        # Names sharing a stem or synonym with the search words match as well
+        term_hits = catalog.index('terms').containing(self.term) if self.term else []
+        rows = backend.select(
+            search=self.term if self.mode == 'substring' else None,
+            names=_names(catalog.df)[term_hits].tolist(),
+            ranges=combine_ranges(self.ranges, *(DIET_PRESETS[name] for name in self.presets)),
+            groups=self._filter_groups()
+        )
+        return Selection(catalog.df, rows)
+
+    def _search(self, selection, warnings, refiner):
+        catalog, term = self.catalog, self.term
+        if self.mode == 'ranked':
+            # Boolean match over word postings; the best BM25 matches lead the rows
+            try:
+                hits, scores = catalog.index('ranked').search(term)
+            except QueryError as e:
+                warnings.append(f'Invalid search query: {e}')
+                return selection
+            best = np.array([name_id for _, name_id in top_k(hits, scores, self.lead)], dtype=np.int64)
+            return selection.matching(FOOD_COLUMN, hits, leading=best)
+        if self.mode == 'fuzzy':
+            # Closest spellings first: rows follow the ranking of their food name
+            hits, _ = catalog.index('fuzzy').search(term)
+            return selection.matching(FOOD_COLUMN, hits, ranked=True)
+        if self.mode == 'regex':
+            # Trigram prefilter, then the regex on the surviving names only
+            try:
+                hits = catalog.index('names').match(term)
+            except re.error as e:
+                warnings.append(f'Invalid regular expression: {e}')
+                return selection
+            return selection.matching(FOOD_COLUMN, hits)
+        if catalog.backend is not None:
+            return selection
+        # Substring hits from the trigram posting lists, plus the names that
+        # share every word's stem or synonym ("potatoes", "aubergine")
+        substring_hits = catalog.index('names').search(term)
+        hits = np.union1d(substring_hits, catalog.index('terms').containing(term))
+        selection = selection.matching(FOOD_COLUMN, hits)
+        if refiner is not None:
+            refiner.remember(self.filter_key(), term, substring_hits, selection)
+        return selection
+
+    def _select(self, plan, warnings, refiner):
+        """Runs the filters and the search; returns the selection and its free count."""
+        catalog = self.catalog
+        backend = catalog.backend
+        if self.mode == 'substring' and backend is None and refiner is not None:
+            # While the term only grows under the same filters, narrow the
+            # previous result instead of starting over
+            refined = refiner.refine(self.filter_key(), self.term, catalog.index('names'),
+                                     catalog.index('terms'))
+            if refined is not None:
+                return refined, None
+        if backend is not None:
+            selection, counted = self._backend_select(backend), None
+        else:
+            selection, counted = self._indexed(plan)
+        for expression in self.expressions:
+            # Compiled once per expression, then evaluated over the rows the
+            # indexes left, reading each referenced column once
+            try:
+                compiled = compile_expression(expression)
+            except ExpressionError as e:
+                warnings.append(f'Invalid filter expression: {e}')
+                continue
+            values = {col: selection.column(col) for col in compiled.columns}
+            selection, counted = selection.restrict(compiled.evaluate(values, len(selection))), None
+        if self.term:
+            selection, counted = self._search(selection, warnings, refiner), None
+        return selection, counted
+
+    def _prefix_range(self, plan):
+        """``(column, low, high)`` of the only range left by the filters (all
+        ``None`` for no filter), or ``None`` when the rows are not one range."""
+        if (self.catalog.backend is not None or self.expressions or self.term
+                or len(plan.predicates) > 1 or not all(p.is_range for p in plan.predicates)):
+            return None
+        if not plan.predicates:
+            return None, None, None
+        predicate = plan.predicates[0]
+        return predicate.column, predicate.low, predicate.high
+
+    def execute(self, refiner=None):
+        """Runs the query and returns a ``Result``.
+
+        A ``refine.SearchRefiner`` lets a growing substring search reuse the
+        previous result of the same session.
+        """
+        warnings = []
+        plan = self.plan()
+        selection, counted = self._select(plan, warnings, refiner)
+        gathered = {}
+
+        def column(name):
+            # One gather per referenced column, shared by every output
+            if name not in gathered:
+                gathered[name] = selection.column(name)
+            return gathered[name]
+
+        aggregates = {}
+        prefix_range = self._prefix_range(plan)
+        for name, (col, func) in self.aggregates.items():
+            if func == 'nunique':
+                aggregates[name] = selection.nunique(col)
+            elif prefix_range is not None and func in PREFIX_AGGREGATES:
+                # One range at most: prefix sums over its sorted order, no gather
+                aggregates[name] = self.catalog.index('aggregates').aggregate(col, func, *prefix_range)
+            else:
+                aggregates[name] = AGGREGATES[func](column(col))
+        top = {}
+        df = self.catalog.df
+        # Every ranked column in one partial selection, each to its largest n
+        ks = {}
+        for col, n, _ in self.tops.values():
+            ks[col] = max(ks.get(col, 0), n)
+        ranked = top_rows({col: column(col) for col in ks}, ks)
+        for name, (col, n, columns) in self.tops.items():
+            # The other columns are read for the n rows only
+            best = ranked[col][:n]
+            rows = best if selection.rows is None else selection.rows[best]
+            top[name] = df.iloc[rows, [df.columns.get_loc(c) for c in columns]]
+        return Result(selection, len(selection) if counted is None else counted,
+                      aggregates, top, warnings, plan)
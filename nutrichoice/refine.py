@@ -0,0 +1,50 @@
+"""Incremental refinement of a substring search as the term grows.
+
+While a user types "c", "ch", "chi", "chic", every new term contains the
+previous one, so its matches are a subset of the previous matches as long as
+the numeric and group filters have not moved. ``SearchRefiner`` remembers one
+session's last substring search and, in that case, checks the new term
+against the previous matching names and rows only, so each keystroke costs in
+proportion to the current result rather than to the catalogue.
+"""
+import numpy as np
+
+from nutrichoice.schema import FOOD_COLUMN
+
+
+class SearchRefiner:
+    """The last substring search of one session: filter state, term, name hits and rows."""
+
+    def __init__(self):
+        self.forget()
+
+    def forget(self):
+        self.state = None
+        self.term = None
+        self.hits = None
+        self.selection = None
+
+    def remember(self, state, term, hits, selection):
+        """Records a search: ``hits`` are the substring-matching name ids."""
+        self.state, self.term = state, term.lower()
+        self.hits, self.selection = hits, selection
+
+    def refine(self, state, term, name_index, term_index=None):
+        """Returns the selection for ``term`` derived from the last search, or ``None``.
+
+        Refinement applies only when ``state`` (the other filters) is unchanged
+        and ``term`` contains the previous term. Names matched only through
+        ``term_index`` (stems and synonyms) are not in the previous result, so
+        if the longer term has any of those the caller must search afresh.
+        """
+        term = term.lower()
+        if self.selection is None or state != self.state or self.term not in term:
+            return None
+        if term == self.term:
+            return self.selection
+        hits = name_index.search(term, within=self.hits)
+        if term_index is not None and len(np.setdiff1d(term_index.containing(term), hits)):
+            return None
+        selection = self.selection.matching(FOOD_COLUMN, hits)
+        self.remember(state, term, hits, selection)
+        return selection
@@ -0,0 +1,147 @@
+"""Registry of the ``FOOD-DATA-GROUP<n>`` datasets in a directory.
+
+Each group is a cleaned CSV (``FOOD-DATA-GROUP2_cleaned.csv``) or a column
+store built from one (``FOOD-DATA-GROUP2_cleaned.columns``). ``load_catalog``
+opens every group on a thread pool, so startup costs roughly the slowest group
+rather than the sum of all of them, and unions them into one frame with a
+categorical ``group`` column the dashboard can filter on.
+
+Concatenating mapped frames would copy every column into private memory, so
+with several groups the union is itself written once to a column store,
+``CATALOG_STORE``, next to the groups and mapped like any other. It is tagged
+with the groups' signatures and rebuilt when any group changes.
+"""
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from nutrichoice.colstats import TableStats
+from nutrichoice.colstore import (FORMAT_VERSION, ColumnStore, StoreWriter, ensure_store, read_manifest,
+                                  store_lock)
+from nutrichoice.schema import FOOD_COLUMN
+from nutrichoice.signature import dataset_signature
+
+GROUP_COLUMN = 'group'
+
+CATALOG_STORE = 'FOOD-DATA-catalog.columns'
+
+_GROUP_FILE = re.compile(r'^FOOD-DATA-GROUP(\d+)_cleaned\.(csv|columns)$')
+
+
+def group_label(number):
+    return f'Group {number}'
+
+
+def discover(directory='.'):
+    """Returns ``{label: path}`` for every group dataset, in group order.
+
+    A group with both a CSV and a column store is listed once, by its CSV, so
+    the store is rebuilt whenever the CSV changes.
+    """
+    found = {}
+    for entry in os.listdir(directory):
+        match = _GROUP_FILE.match(entry)
+        if not match:
+            continue
+        number = int(match.group(1))
+        if number not in found or match.group(2) == 'csv':
+            found[number] = os.path.join(directory, entry)
+    return {group_label(number): found[number] for number in sorted(found)}
+
+
+def signatures(groups):
+    """Content signatures of every group, used as the catalog's cache key."""
+    return tuple((label, dataset_signature(path)) for label, path in groups.items())
+
+
+def load_group(path):
+    return ensure_store(path).frame()
+
+
+def load_group_stats(path):
+    return ensure_store(path).stats()
+
+
+def catalog_stats(groups, names=None, max_workers=None):
+    """Merges the saved column statistics of every group, without reading any rows.
+
+    ``names``, the food name categories of the loaded catalog, makes the
+    distinct food count exact (every category occurs in some group). The
+    result also records the row count of each group in ``groups``.
+    """
+    labels = list(groups)
+    with ThreadPoolExecutor(max_workers=max_workers or min(8, len(labels) or 1)) as pool:
+        parts = list(pool.map(load_group_stats, groups.values()))
+    stats = TableStats()
+    for part in parts:
+        stats = stats.merge(part)
+    if names is not None and FOOD_COLUMN in stats.columns:
+        stats[FOOD_COLUMN].exact_distinct = len(names)
+    stats.groups = {label: part.rows for label, part in zip(labels, parts)}
+    return stats
+
+
+def _has_source(path, source):
+    try:
+        manifest = read_manifest(path)
+    except (OSError, ValueError):
+        return False
+    return manifest.get('format') == FORMAT_VERSION and manifest.get('source') == source
+
+
+def _catalog_frame(groups, frames):
+    """Maps the union of the groups from ``CATALOG_STORE``, writing it first if stale."""
+    path = os.path.join(os.path.dirname(next(iter(groups.values()))), CATALOG_STORE)
+    source = repr(signatures(groups))
+    if not _has_source(path, source):
+        with store_lock(path):
+            # Another process may have written it while this one waited
+            if not _has_source(path, source):
+                dtype = np.result_type(*(frame[col].dtype for frame in frames
+                                         for col in frame.columns if col != FOOD_COLUMN))
+                # The writer merges the groups' name tables into one
+                writer = StoreWriter.create(path, dtype=dtype, source=source)
+                for frame in frames:
+                    writer.append(frame)
+                writer.commit()
+    return ColumnStore(path).frame()
+
+
+def _concat_frames(frames):
+    # Recode every group's names onto one shared name table so the union stays
+    # dictionary-encoded instead of falling back to one string per row.
+    names = union_categoricals([frame[FOOD_COLUMN] for frame in frames], ignore_order=True)
+    parts = [frame.assign(**{FOOD_COLUMN: frame[FOOD_COLUMN].cat.set_categories(names.categories)})
+             for frame in frames]
+    return pd.concat(parts, ignore_index=True)
+
+
+def load_catalog(groups, max_workers=None):
+    """Loads every group concurrently and returns them as one frame.
+
+    The nutrient columns stay memory maps: over the group's own store for a
+    single group, over ``CATALOG_STORE`` for several. Only where that store
+    cannot be written (a read-only directory) are the groups concatenated
+    into private memory instead.
+    """
+    labels = list(groups)
+    with ThreadPoolExecutor(max_workers=max_workers or min(8, len(labels) or 1)) as pool:
+        frames = list(pool.map(load_group, groups.values()))
+
+    if len(frames) == 1:
+        # A shallow copy keeps the nutrient columns on the mapped store files.
+        df = frames[0].copy(deep=False)
+    else:
+        try:
+            df = _catalog_frame(groups, frames)
+        except OSError:
+            df = _concat_frames(frames)
+    # Rows are in group order, so the group codes are runs of each group's length
+    df[GROUP_COLUMN] = pd.Categorical.from_codes(
+        np.repeat(np.arange(len(frames), dtype='int16'), [len(frame) for frame in frames]),
+        dtype=pd.CategoricalDtype(labels))
+    return df
@@ -0,0 +1,96 @@
+"""Bounded LRU cache for computed dashboard results.
+
+The sidebar state (search term and mode, ranges, groups, top N) fully
+determines what the page shows, and many sessions sit on the same default or
+popular states. ``ResultCache`` maps a normalized filter key to the selected
+row ids plus the KPIs and chart inputs computed from them, evicting the least
+recently used entries once their estimated size exceeds a byte budget. One
+instance is shared by all sessions, so it is guarded by a lock.
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def sizeof(value):
+    """Estimates the memory held by a cached value, in bytes."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(index=True, deep=True)
+        return int(usage.sum() if isinstance(value, pd.DataFrame) else usage)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(k) + sizeof(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sizeof(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def normalize_term(term, fold_case=True, fold_space=True):
+    """Canonical form of a search term, so equivalent searches share a cache key.
+
+    Fold case and whitespace runs only where the search ignores them.
+    """
+    term = term or ''
+    if fold_space:
+        term = ' '.join(term.split())
+    return term.lower() if fold_case else term
+
+
+class ResultCache:
+    """Thread-safe LRU mapping with a memory budget and hit/miss counters."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns the cached value for ``key`` (marking it recently used), or ``None``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """Stores a value, evicting least recently used entries to stay within budget.
+
+        A value larger than the whole budget is not stored.
+        """
+        size = sizeof(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.bytes,
+                    'max_bytes': self.max_bytes, 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,18 @@
+"""Column names and dtypes shared by the dashboard and the data tools."""
+
+FOOD_COLUMN = 'food'
+
+NUTRIENT_COLUMNS = [
+    'Caloric Value', 'Fat', 'Saturated Fats', 'Monounsaturated Fats',
+    'Polyunsaturated Fats', 'Carbohydrates', 'Sugars', 'Protein',
+    'Dietary Fiber', 'Cholesterol', 'Sodium', 'Water', 'Vitamin A',
+    'Vitamin B1', 'Vitamin B11', 'Vitamin B12', 'Vitamin B2', 'Vitamin B3',
+    'Vitamin B5', 'Vitamin B6', 'Vitamin C', 'Vitamin D', 'Vitamin E',
+    'Vitamin K', 'Calcium', 'Copper', 'Iron', 'Magnesium', 'Manganese',
+    'Phosphorus', 'Potassium', 'Selenium', 'Zinc', 'Nutrition Density',
+]
+
+COLUMNS = [FOOD_COLUMN] + NUTRIENT_COLUMNS
+
+# Explicit dtypes so readers never have to infer them from text.
+CSV_DTYPES = {FOOD_COLUMN: 'str', **{col: 'float64' for col in NUTRIENT_COLUMNS}}
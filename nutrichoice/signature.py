@@ -0,0 +1,59 @@
+"""Content signatures used to key caches on what a dataset actually holds.
+
+``dataset_signature`` is called on every rerun, so it must be cheap: it stats
+the file and only re-hashes the content when the size or mtime differ from
+the last time it was hashed in this process. Touching a file without changing
+it therefore costs one hash and still yields the same signature.
+"""
+import hashlib
+import os
+import threading
+
+_BLOCK_SIZE = 1 << 20
+
+_lock = threading.Lock()
+_hashes = {}
+
+
+def content_hash(path):
+    """Returns a BLAKE2 digest of a file, re-hashing only after it changes."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        digest = _hashes.get(key)
+    if digest is None:
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(_BLOCK_SIZE), b''):
+                h.update(block)
+        digest = h.hexdigest()
+        with _lock:
+            # Keep a single entry per path so the memo cannot grow unbounded.
+            for old in [k for k in _hashes if k[0] == key[0]]:
+                del _hashes[old]
+            _hashes[key] = digest
+    return digest
+
+
+def forget(path):
+    """Drops the memoized hash of ``path`` so the next call re-reads it."""
+    path = os.path.abspath(path)
+    with _lock:
+        for key in [k for k in _hashes if k[0] == path]:
+            del _hashes[key]
+
+
+def source_fingerprint(path):
+    """Size and content hash of a source file, used to detect stale builds."""
+    return {'size': os.path.getsize(path), 'hash': content_hash(path)}
+
+
+def dataset_signature(path):
+    """Returns a string that changes exactly when a dataset's content changes.
+
+    ``path`` is either a data file or a column store directory, in which case
+    the store's manifest (rewritten on every commit) is hashed.
+    """
+    if os.path.isdir(path):
+        return content_hash(os.path.join(path, 'manifest.json'))
+    return content_hash(path)
@@ -0,0 +1,206 @@
+"""Optional SQLite backend that answers the sidebar filters from indexes.
+
+The catalog is copied once into a SQLite file with a B-tree index on every
+nutrient column and an FTS5 trigram index over the food names. ``select``
+pushes the calorie/protein ranges, the group filter and the search term down
+into one SQL query and returns only the positions of the matching rows, so a
+slider drag costs an index range scan instead of a pass over every row.
+
+Enable it for the dashboard with ``NUTRICHOICE_BACKEND=sqlite``. Search terms
+are matched as plain substrings; regex searches go through the in-memory
+``trigram.TrigramIndex`` instead.
+
+The file is built under a temporary name and swapped in once complete.
+Workers that find it missing or stale rebuild it one at a time, under a lock
+file next to it, and each checks again once it holds the lock.
+"""
+import json
+import os
+import sqlite3
+import threading
+import uuid
+
+import numpy as np
+
+from nutrichoice.locking import file_lock
+from nutrichoice.schema import FOOD_COLUMN, NUTRIENT_COLUMNS
+
+TABLE = 'foods'
+FTS_TABLE = 'foods_fts'
+GROUP_COLUMN = 'group'
+_BATCH_ROWS = 50_000
+LOCK_SUFFIX = '.lock'
+
+# The trigram tokenizer needs at least three characters to use the index.
+_MIN_FTS_TERM = 3
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _like_pattern(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def database_lock(path):
+    """Holds the build lock of the database at ``path``; see ``locking.file_lock``."""
+    return file_lock(path + LOCK_SUFFIX)
+
+
+def _remove_stale_tmp_files(path):
+    # Under the build lock any other temporary file is left over from a
+    # builder that died.
+    directory, name = os.path.split(os.path.abspath(path))
+    for entry in os.listdir(directory):
+        if entry.startswith(name + '.') and entry.endswith('.tmp'):
+            try:
+                os.remove(os.path.join(directory, entry))
+            except OSError:
+                pass
+
+
+def build_database(df, path, signature=None, indexed=NUTRIENT_COLUMNS):
+    """Writes ``df`` to a new SQLite file at ``path`` and returns the path.
+
+    Row ids are the row positions in ``df``, so query results can be used to
+    index the in-memory frame directly. Builders of the same path take turns
+    through ``database_lock``.
+    """
+    with database_lock(path):
+        _write_database(df, path, signature=signature, indexed=indexed)
+    return path
+
+
+def _write_database(df, path, signature=None, indexed=NUTRIENT_COLUMNS):
+    _remove_stale_tmp_files(path)
+    # The file is built under a name of its own and swapped in when complete
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    has_groups = GROUP_COLUMN in df.columns
+    columns = [FOOD_COLUMN] + ([GROUP_COLUMN] if has_groups else []) + NUTRIENT_COLUMNS
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+        col_defs = ', '.join(
+            [f'{_quote(FOOD_COLUMN)} TEXT']
+            + ([f'{_quote(GROUP_COLUMN)} TEXT'] if has_groups else [])
+            + [f'{_quote(col)} REAL' for col in NUTRIENT_COLUMNS])
+        conn.execute(f'CREATE TABLE {TABLE} (rowid INTEGER PRIMARY KEY, {col_defs})')
+
+        insert = (f'INSERT INTO {TABLE} VALUES '
+                  f'({", ".join("?" * (len(columns) + 1))})')
+        for start in range(0, len(df), _BATCH_ROWS):
+            batch = df.iloc[start:start + _BATCH_ROWS]
+            values = [batch[col].astype('str').tolist() if col == GROUP_COLUMN
+                      else batch[col].tolist() for col in columns]
+            conn.executemany(insert, zip(range(start, start + len(batch)), *values))
+
+        for col in list(indexed) + ([GROUP_COLUMN] if has_groups else []):
+            conn.execute(f'CREATE INDEX {_quote("idx_" + col)} ON {TABLE} ({_quote(col)})')
+        conn.execute(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                     f"{_quote(FOOD_COLUMN)}, content='{TABLE}', content_rowid='rowid', "
+                     f"tokenize='trigram')")
+        conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        conn.execute('INSERT INTO meta VALUES (?, ?)', ('signature', str(signature)))
+        conn.execute('ANALYZE')
+        conn.commit()
+    except BaseException:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+    os.replace(tmp_path, path)
+
+
+def stored_signature(path):
+    """Returns the dataset signature a database was built from, if any."""
+    try:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    except sqlite3.Error:
+        return None
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+def _is_current(path, signature):
+    return os.path.exists(path) and stored_signature(path) == str(signature)
+
+
+class SQLiteBackend:
+    """Read-only query interface over a database written by ``build_database``."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        info = self.conn.execute(f'PRAGMA table_info({TABLE})').fetchall()
+        self.has_groups = any(row[1] == GROUP_COLUMN for row in info)
+
+    @classmethod
+    def open(cls, df, path, signature=None):
+        """Opens the database at ``path``, rebuilding it if it is out of date."""
+        if not _is_current(path, signature):
+            with database_lock(path):
+                # Another process may have rebuilt it while this one waited
+                if not _is_current(path, signature):
+                    _write_database(df, path, signature=signature)
+        return cls(path)
+
+    def _connect(self):
+        return sqlite3.connect(f'file:{self.path}?mode=ro', uri=True,
+                               check_same_thread=False)
+
+    @property
+    def conn(self):
+        # Streamlit runs each session on its own thread; give each one a connection.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _where(self, search=None, ranges=None, groups=None, names=None):
+        clauses, params = [], []
+        for col, (low, high) in (ranges or {}).items():
+            clauses.append(f'{_quote(col)} BETWEEN ? AND ?')
+            params.extend([float(low), float(high)])
+        if groups is not None and self.has_groups:
+            groups = list(groups)
+            clauses.append(f'{_quote(GROUP_COLUMN)} IN ({", ".join("?" * len(groups))})')
+            params.extend(groups)
+        if search:
+            if len(search) >= _MIN_FTS_TERM:
+                phrase = '"' + search.replace('"', '""') + '"'
+                clause = f'rowid IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?)'
+                params.append(phrase)
+            else:
+                clause = f"{_quote(FOOD_COLUMN)} LIKE ? ESCAPE '\\'"
+                params.append(_like_pattern(search))
+            if names:
+                # Names found some other way (e.g. by stem or synonym) also
+                # match. They go in as one JSON array, since a parameter per
+                # name would run past SQLite's variable limit on a common word.
+                clause = (f'({clause} OR {_quote(FOOD_COLUMN)} IN '
+                          f'(SELECT value FROM json_each(?)))')
+                params.append(json.dumps(list(names)))
+            clauses.append(clause)
+        where = ' AND '.join(clauses) if clauses else '1'
+        return where, params
+
+    def select(self, search=None, ranges=None, groups=None, names=None):
+        """Returns the positions of the rows matching every predicate, in order.
+
+        ``ranges`` maps nutrient columns to inclusive ``(low, high)`` bounds.
+        Rows whose food is in ``names`` count as search matches too.
+        """
+        where, params = self._where(search, ranges, groups, names)
+        rows = self.conn.execute(
+            f'SELECT rowid FROM {TABLE} WHERE {where} ORDER BY rowid', params)
+        return np.fromiter((row[0] for row in rows), dtype=np.int64)
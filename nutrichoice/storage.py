@@ -0,0 +1,112 @@
+"""Compiled Parquet copies of the food CSV datasets.
+
+Parsing the CSV means tokenising text and inferring dtypes for every column
+on every cold start. ``build_dataset`` does that work once and writes a typed
+Parquet file next to the CSV. The file footer carries the schema, the row
+count and the size and content hash of the CSV it was compiled from, so a
+reader can tell whether it is still current without touching the data pages.
+
+Usage::
+
+    python -m nutrichoice.storage FOOD-DATA-GROUP1_cleaned.csv
+"""
+import argparse
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from nutrichoice.schema import COLUMNS, CSV_DTYPES, FOOD_COLUMN, NUTRIENT_COLUMNS
+from nutrichoice.signature import source_fingerprint
+
+ARROW_SCHEMA = pa.schema(
+    [pa.field(FOOD_COLUMN, pa.string())]
+    + [pa.field(col, pa.float64()) for col in NUTRIENT_COLUMNS]
+)
+
+_META_ROWS = b'nutrichoice.rows'
+_META_SOURCE_SIZE = b'nutrichoice.source_size'
+_META_SOURCE_HASH = b'nutrichoice.source_hash'
+
+
+def compiled_path(csv_path):
+    """Returns the Parquet path that belongs to a CSV dataset."""
+    return os.path.splitext(csv_path)[0] + '.parquet'
+
+
+def read_csv(csv_path):
+    """Reads a cleaned food CSV with explicit dtypes."""
+    return pd.read_csv(csv_path, usecols=COLUMNS, dtype=CSV_DTYPES)[COLUMNS]
+
+
+def build_dataset(csv_path, out_path=None):
+    """Compiles a cleaned CSV into a typed Parquet file and returns its path."""
+    out_path = out_path or compiled_path(csv_path)
+    source = source_fingerprint(csv_path)
+    df = read_csv(csv_path)
+
+    table = pa.Table.from_pandas(df, schema=ARROW_SCHEMA, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata.update({
+        _META_ROWS: str(table.num_rows).encode(),
+        _META_SOURCE_SIZE: str(source['size']).encode(),
+        _META_SOURCE_HASH: source['hash'].encode(),
+    })
+    table = table.replace_schema_metadata(metadata)
+
+    # Write to a temporary file first so readers never see a half-written file.
+    tmp_path = out_path + '.tmp'
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def dataset_info(parquet_path):
+    """Reads the row count and source fingerprint from a compiled file's footer."""
+    metadata = pq.read_metadata(parquet_path)
+    kv = metadata.metadata or {}
+    return {
+        'rows': metadata.num_rows,
+        'schema': metadata.schema.to_arrow_schema(),
+        'source': {
+            'size': int(kv.get(_META_SOURCE_SIZE, -1)),
+            'hash': kv.get(_META_SOURCE_HASH, b'').decode(),
+        },
+    }
+
+
+def is_fresh(csv_path, parquet_path=None):
+    """Checks that a compiled file exists and was built from the current CSV."""
+    parquet_path = parquet_path or compiled_path(csv_path)
+    if not os.path.exists(parquet_path):
+        return False
+    if not os.path.exists(csv_path):
+        # The compiled file is all there is, so it is the source of truth.
+        return True
+    try:
+        info = dataset_info(parquet_path)
+    except (OSError, pa.ArrowException):
+        return False
+    return info['source'] == source_fingerprint(csv_path)
+
+
+def read_dataset(csv_path):
+    """Loads a dataset from its compiled file, falling back to the CSV."""
+    parquet_path = compiled_path(csv_path)
+    if is_fresh(csv_path, parquet_path):
+        return pd.read_parquet(parquet_path, columns=COLUMNS)
+    return read_csv(csv_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compile food CSVs into Parquet.')
+    parser.add_argument('csv', nargs='+', help='cleaned food CSV file(s)')
+    args = parser.parse_args(argv)
+    for csv_path in args.csv:
+        out_path = build_dataset(csv_path)
+        print(f"{csv_path} -> {out_path} ({dataset_info(out_path)['rows']} rows)")
+
+
+if __name__ == '__main__':
+    main()
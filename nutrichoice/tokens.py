@@ -0,0 +1,90 @@
+"""Word-level inverted index over the distinct food names.
+
+Names are split into lower-case word tokens once at load. ``TokenIndex`` keeps
+the vocabulary and, per word, the sorted ids of the names containing it along
+with how often it occurs there, so word-based searches are a few dictionary
+lookups and posting-list merges instead of a scan over every name.
+
+An optional ``analyze`` function maps each token to the term that is indexed
+(see ``analysis.analyze`` for stemming and synonyms). It runs once per
+distinct token, and queries go through the same mapping via ``terms``.
+"""
+import re
+
+import numpy as np
+
+_TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Splits text into lower-case word tokens."""
+    return _TOKEN.findall(text.lower())
+
+
+class TokenIndex:
+    """Vocabulary and per-word posting lists for a list of names."""
+
+    def __init__(self, names, analyze=None):
+        self.names = list(names)
+        self.analyze = analyze
+        self._terms = {}
+        self.word_ids = {}
+        word_column, name_column = [], []
+        self.lengths = np.zeros(len(self.names), dtype=np.int32)
+        for name_id, name in enumerate(self.names):
+            tokens = self.terms(name)
+            self.lengths[name_id] = len(tokens)
+            for token in tokens:
+                word_column.append(self.word_ids.setdefault(token, len(self.word_ids)))
+                name_column.append(name_id)
+        self.words = list(self.word_ids)
+
+        # Sort (word, name) pairs once; runs of equal pairs are term counts.
+        stride = max(len(self.names), 1)
+        pairs = np.sort(np.array(word_column, dtype=np.int64) * stride
+                        + np.array(name_column, dtype=np.int64))
+        first = np.ones(len(pairs), dtype=bool)
+        first[1:] = pairs[1:] != pairs[:-1]
+        starts = np.flatnonzero(first)
+        pairs, self.counts = pairs[starts], np.diff(np.append(starts, len(pairs)))
+        self.postings = (pairs % stride).astype(np.int32)
+        self.offsets = np.searchsorted(pairs // stride, np.arange(len(self.words) + 1))
+        self.doc_freq = np.diff(self.offsets)
+
+    def __len__(self):
+        return len(self.names)
+
+    def term(self, token):
+        """Maps a token to the term it is indexed under."""
+        if self.analyze is None:
+            return token
+        term = self._terms.get(token)
+        if term is None:
+            term = self._terms[token] = self.analyze(token)
+        return term
+
+    def terms(self, text):
+        """Tokenizes text into indexed terms."""
+        return [self.term(token) for token in tokenize(text)]
+
+    def containing(self, text):
+        """Returns the sorted ids of the names containing every term of ``text``."""
+        ids = None
+        for term in self.terms(text):
+            word_id = self.word_id(term)
+            if word_id is None:
+                return self.postings[:0]
+            posting = self.posting(word_id)
+            ids = posting if ids is None else np.intersect1d(ids, posting, assume_unique=True)
+        return self.postings[:0] if ids is None else ids
+
+    def word_id(self, word):
+        return self.word_ids.get(word)
+
+    def posting(self, word_id):
+        """Returns the sorted ids of the names containing a word."""
+        return self.postings[self.offsets[word_id]:self.offsets[word_id + 1]]
+
+    def term_counts(self, word_id):
+        """Returns how often the word occurs in each name of its posting list."""
+        return self.counts[self.offsets[word_id]:self.offsets[word_id + 1]]
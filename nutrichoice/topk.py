@@ -0,0 +1,59 @@
+"""Top-K rows for several columns at once, by partial selection.
+
+The dashboard ranks the same selected rows by protein, carbohydrates, fat and
+calories. ``top_rows`` stacks the requested columns and runs one
+``np.argpartition`` over the matrix, which moves each column's ``k`` largest
+values to the front in linear time without sorting the rest. Only those
+``k`` candidates per column are then sorted.
+
+The order matches ``pandas.Series.nlargest``: largest value first, ties by
+position, and missing values last (only when fewer than ``k`` values are
+present), also by position. A tie straddling the partition boundary is
+resolved against the whole column, so a row tied with the k-th value is never
+dropped in favour of a later one.
+"""
+import numpy as np
+
+
+def _ordered(negated, candidates):
+    # Ascending negated value (largest first, NaNs last), ties by position
+    candidates = np.sort(candidates)
+    return candidates[np.argsort(negated[candidates], kind='stable')]
+
+
+def top_rows(columns, ks):
+    """Returns, for each column, the positions of its ``k`` largest values in order.
+
+    ``columns`` maps names to equal-length numeric arrays and ``ks`` maps the
+    names to rank to their ``k``. Fewer positions come back when the column
+    has fewer rows.
+    """
+    names = [name for name in ks if ks[name] > 0]
+    top = {name: np.empty(0, dtype=np.int64) for name in ks}
+    if not names:
+        return top
+    # One row per column, so each partition runs over contiguous memory
+    negated = np.stack([np.asarray(columns[name], dtype=np.float64) for name in names])
+    np.negative(negated, out=negated)
+    rows = negated.shape[1]
+    k_max = min(max(ks[name] for name in names), rows)
+    if not k_max:
+        return top
+    if k_max < rows:
+        candidates = np.argpartition(negated, k_max - 1, axis=1)[:, :k_max]
+    else:
+        candidates = np.broadcast_to(np.arange(rows), negated.shape)
+    for j, name in enumerate(names):
+        column = negated[j]
+        best = _ordered(column, candidates[j])[:ks[name]]
+        if k_max < rows:
+            boundary = column[candidates[j, k_max - 1]]
+            if np.isnan(column[best[-1]]):
+                # Fewer values than k: the missing ones follow by position
+                best = _ordered(column, np.arange(rows))[:ks[name]]
+            elif column[best[-1]] >= boundary:
+                # The k-th value ties the partition's edge: equal values may
+                # sit outside the candidates at earlier positions
+                best = _ordered(column, np.flatnonzero(column <= boundary))[:ks[name]]
+        top[name] = best
+    return top
@@ -0,0 +1,203 @@
+"""Trigram inverted index over the distinct food names.
+
+Every lower-cased name is cut into its overlapping three-character substrings
+(trigrams), and each trigram keeps the sorted ids of the names it occurs in. A
+substring query needs every one of its own trigrams, so intersecting their
+posting lists, shortest first, leaves a handful of candidate names that are
+then checked directly. Regex queries use the same lists as a prefilter: the
+literal runs every match must contain are looked up first, and the regex is
+run on the surviving names only.
+
+The index is built with array operations: names are joined into one array of
+code points, each trigram becomes one integer key, and the posting lists fall
+out of a single sort of (key, name id) pairs.
+"""
+import re
+
+import numpy as np
+
+_SEPARATOR = '\x00'
+
+# Characters that end a literal run in a regex, and quantifiers that make the
+# preceding character optional.
+_SPECIAL = set('.^$*+?{}[]()|\\')
+_OPTIONAL = set('*?')
+
+
+def _codepoints(text):
+    return np.frombuffer(text.encode('utf-32-le'), dtype='<u4').astype(np.int64)
+
+
+def _sorted_unique(values):
+    """Distinct values of a sorted array (cheaper than ``np.unique``)."""
+    keep = np.ones(len(values), dtype=bool)
+    keep[1:] = values[1:] != values[:-1]
+    return values[keep], np.flatnonzero(keep)
+
+
+def required_literals(pattern):
+    """Returns substrings every match of ``pattern`` must contain.
+
+    Only literal runs outside groups and character classes are collected, and
+    a top-level alternation yields nothing. An empty list means the pattern
+    cannot be prefiltered.
+    """
+    if '(?' in pattern:
+        # Inline flags such as verbose mode change what a literal means.
+        return []
+    literals, run = [], []
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\' and i + 1 < len(pattern):
+            escaped = pattern[i + 1]
+            if depth or escaped.isalnum():
+                literals.append(''.join(run))
+                run = []
+            else:
+                run.append(escaped)
+            i += 2
+            continue
+        if char == '[':
+            # Skip the class; a ']' right after '[' or '[^' is part of it.
+            i += 1
+            if i < len(pattern) and pattern[i] == '^':
+                i += 1
+            if i < len(pattern) and pattern[i] == ']':
+                i += 1
+            while i < len(pattern) and pattern[i] != ']':
+                i += 2 if pattern[i] == '\\' else 1
+            literals.append(''.join(run))
+            run = []
+            i += 1
+            continue
+        if char == '{':
+            # A repeat count; the character before it may occur zero times.
+            if run:
+                run.pop()
+            literals.append(''.join(run))
+            run = []
+            while i < len(pattern) and pattern[i] != '}':
+                i += 1
+            i += 1
+            continue
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth = max(depth - 1, 0)
+        elif char == '|' and depth == 0:
+            return []
+        if depth or char in _SPECIAL:
+            if char in _OPTIONAL and run:
+                run.pop()
+            literals.append(''.join(run))
+            run = []
+        else:
+            run.append(char)
+        i += 1
+    literals.append(''.join(run))
+    return [literal.lower() for literal in literals if literal]
+
+
+class TrigramIndex:
+    """Posting lists from trigrams to the ids of the names containing them."""
+
+    def __init__(self, names):
+        self.names = list(names)
+        self._lowered = [name.lower() for name in self.names]
+        self._build()
+
+    def __len__(self):
+        return len(self.names)
+
+    def _build(self):
+        points = _codepoints(_SEPARATOR.join(self._lowered))
+        # Number the characters that occur densely so a trigram key is
+        # small enough to share one int64 with the id of its name.
+        present = np.bincount(points, minlength=1) > 0
+        self._alphabet = np.cumsum(present) - 1
+        self._alphabet[~present] = -1
+        self._base = int(present.sum())
+        letters = self._alphabet[points]
+
+        separator = points == ord(_SEPARATOR)
+        name_ids = np.cumsum(separator) - separator
+        keys = self._pack(letters)
+        valid = ~(separator[:-2] | separator[1:-1] | separator[2:])
+        stride = max(len(self.names), 1)
+        if self._base ** 3 * stride >= 2 ** 63:
+            raise ValueError('too many distinct characters to index')
+
+        # One sort of (trigram, name) pairs groups the posting lists and
+        # orders each of them; repeats of a trigram within a name collapse.
+        pairs, _ = _sorted_unique(np.sort(keys[valid] * stride + name_ids[:-2][valid]))
+        keys = pairs // stride
+        self.postings = (pairs % stride).astype(np.int32)
+        self.keys, starts = _sorted_unique(keys)
+        self.offsets = np.append(starts, len(keys))
+
+    def _pack(self, letters):
+        base = self._base
+        return (letters[:-2] * base + letters[1:-1]) * base + letters[2:]
+
+    def trigrams(self, text):
+        """Returns the distinct trigram keys of a lower-cased string.
+
+        Returns ``None`` if the text has a character no name contains.
+        """
+        points = _codepoints(text)
+        if len(points) and (points.max() >= len(self._alphabet)
+                            or (self._alphabet[points] < 0).any()):
+            return None
+        if len(points) < 3:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(self._pack(self._alphabet[points]))
+
+    def posting(self, key):
+        """Returns the sorted ids of the names containing one trigram."""
+        at = np.searchsorted(self.keys, key)
+        if at == len(self.keys) or self.keys[at] != key:
+            return self.postings[:0]
+        return self.postings[self.offsets[at]:self.offsets[at + 1]]
+
+    def candidates(self, literals):
+        """Returns sorted ids of the names containing every literal's trigrams.
+
+        Returns ``None`` when no literal is long enough to narrow anything.
+        """
+        keys = [self.trigrams(literal) for literal in literals]
+        if any(key is None for key in keys):
+            return self.postings[:0]
+        keys = np.unique(np.concatenate(keys or [np.empty(0, dtype=np.int64)]))
+        if not len(keys):
+            return None
+        lists = sorted((self.posting(key) for key in keys), key=len)
+        ids = lists[0]
+        for posting in lists[1:]:
+            if not len(ids):
+                break
+            ids = np.intersect1d(ids, posting, assume_unique=True)
+        return ids
+
+    def _ids(self, candidates):
+        return range(len(self.names)) if candidates is None else candidates.tolist()
+
+    def search(self, term, within=None):
+        """Returns the sorted ids of the names containing ``term``, ignoring case.
+
+        ``within`` (sorted ids) limits the check to those names instead of
+        looking the term up, for refining an earlier, shorter search.
+        """
+        term = term.lower()
+        ids = self._ids(self.candidates([term])) if within is None else within.tolist()
+        return np.array([i for i in ids if term in self._lowered[i]], dtype=np.int64)
+
+    def match(self, pattern, flags=re.IGNORECASE):
+        """Returns the sorted ids of the names ``pattern`` matches anywhere.
+
+        Raises ``re.error`` for an invalid pattern.
+        """
+        regex = re.compile(pattern, flags)
+        ids = self._ids(self.candidates(required_literals(pattern)))
+        return np.array([i for i in ids if regex.search(self.names[i])], dtype=np.int64)
@@ -0,0 +1,148 @@
+"""Multidimensional zone index for range filters over many nutrients.
+
+A dietitian's query constrains five to eight nutrients at once, often with no
+single constraint selective enough for a sorted column (``filters.RangeIndex``)
+to help. ``ZoneIndex`` partitions the rows like the leaves of a k-d tree over
+the min-max normalized nutrient matrix: each node is split at the median of the
+nutrient along which its cell is widest, until nodes hold at most
+``leaf_size`` rows. Every leaf then keeps the min and max of each nutrient (a
+zone map).
+
+A query is answered leaf-wise with vectorized comparisons against the zone
+maps: leaves entirely inside every range contribute all their rows, leaves
+outside any range are skipped, and only the rows of leaves straddling a
+boundary are checked value by value.
+"""
+import numpy as np
+
+from nutrichoice.schema import NUTRIENT_COLUMNS
+
+DEFAULT_LEAF_SIZE = 256
+# Fraction of rows in straddling leaves beyond which a plain scan is cheaper.
+SCAN_FRACTION = 0.25
+
+
+def _concat_slices(values, starts, stops):
+    """Concatenates ``values[start:stop]`` for every pair without a Python loop."""
+    lengths = stops - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return values[:0]
+    shifts = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return values[np.arange(total) + shifts]
+
+
+class ZoneIndex:
+    """k-d partition of the rows with per-leaf min/max for every nutrient."""
+
+    def __init__(self, df, columns=NUTRIENT_COLUMNS, leaf_size=DEFAULT_LEAF_SIZE):
+        self.columns = [col for col in columns if col in df.columns]
+        self.rows = len(df)
+        self._values = {col: df[col].to_numpy() for col in self.columns}
+        self._build(leaf_size)
+
+    def _build(self, leaf_size):
+        index_dtype = np.int32 if self.rows < np.iinfo(np.int32).max else np.int64
+        perm = np.arange(self.rows, dtype=index_dtype)
+        low = np.array([np.nanmin(self._values[col]) if self.rows else 0.0
+                        for col in self.columns], dtype='float64')
+        high = np.array([np.nanmax(self._values[col]) if self.rows else 0.0
+                         for col in self.columns], dtype='float64')
+        span = np.where(high > low, high - low, 1.0)
+
+        # Each node carries its cell in normalized coordinates; splitting the
+        # widest side at the median keeps cells compact along every nutrient.
+        starts = []
+        dims = len(self.columns)
+        stack = [(0, self.rows, np.zeros(dims), np.ones(dims))]
+        while stack:
+            start, stop, cell_low, cell_high = stack.pop()
+            widths = cell_high - cell_low
+            if stop - start <= leaf_size or not widths.any():
+                if stop > start:
+                    starts.append(start)
+                continue
+            d = int(np.argmax(widths))
+            values = self._values[self.columns[d]]
+            ids = perm[start:stop]
+            mid = (stop - start) // 2
+            ids = ids[np.argpartition(values[ids], mid)]
+            perm[start:stop] = ids
+            median = min(max((values[ids[mid]] - low[d]) / span[d], cell_low[d]), cell_high[d])
+            if np.isnan(median):
+                # The upper half is all missing values; nothing left to split on.
+                median = cell_high[d]
+            left_high, right_low = cell_high.copy(), cell_low.copy()
+            left_high[d] = right_low[d] = median
+            stack.append((start + mid, stop, right_low, cell_high))
+            stack.append((start, start + mid, cell_low, left_high))
+
+        self.perm = perm
+        self.leaf_starts = np.array(sorted(starts), dtype=np.int64)
+        self.leaf_stops = np.append(self.leaf_starts[1:], self.rows).astype(np.int64)
+        self.mins, self.maxs, self.has_nan = {}, {}, {}
+        if not len(self.leaf_starts):
+            return
+        for col in self.columns:
+            values = self._values[col][perm]
+            nan = np.isnan(values)
+            self.mins[col] = np.fmin.reduceat(values, self.leaf_starts)
+            self.maxs[col] = np.fmax.reduceat(values, self.leaf_starts)
+            self.has_nan[col] = np.logical_or.reduceat(nan, self.leaf_starts)
+
+    @property
+    def leaves(self):
+        return len(self.leaf_starts)
+
+    def _leaves(self, ranges):
+        # Leaves wholly inside every range, and leaves straddling a boundary.
+        overlap = np.ones(self.leaves, dtype=bool)
+        inside = np.ones(self.leaves, dtype=bool)
+        for col, (low, high) in ranges.items():
+            mins, maxs = self.mins[col], self.maxs[col]
+            overlap &= (maxs >= low) & (mins <= high)
+            inside &= (mins >= low) & (maxs <= high) & ~self.has_nan[col]
+        return inside, overlap & ~inside
+
+    def touched(self, ranges):
+        """Returns ``(inside, partial)``: rows in leaves wholly inside the ranges and
+        rows in leaves that must be checked value by value. Costs only the zone maps.
+        """
+        inside, partial = self._leaves(ranges)
+        sizes = self.leaf_stops - self.leaf_starts
+        return int(sizes[inside].sum()), int(sizes[partial].sum())
+
+    def select(self, ranges):
+        """Returns the sorted positions of rows inside every range.
+
+        ``ranges`` maps nutrient columns to inclusive ``(low, high)`` bounds.
+        Returns ``None`` when every row matches.
+        """
+        inside, partial = self._leaves(ranges)
+        sizes = self.leaf_stops - self.leaf_starts
+        if sizes[partial].sum() > SCAN_FRACTION * self.rows:
+            # Gathering most of the rows through the index costs more than
+            # one sequential pass with masks.
+            return self._scan(ranges)
+        full_rows = _concat_slices(self.perm, self.leaf_starts[inside], self.leaf_stops[inside])
+        candidates = _concat_slices(self.perm, self.leaf_starts[partial], self.leaf_stops[partial])
+        # Each range narrows the candidates, so later ranges gather fewer values.
+        for col, (low, high) in ranges.items():
+            if not len(candidates):
+                break
+            values = self._values[col][candidates]
+            candidates = candidates[(values >= low) & (values <= high)]
+
+        rows = np.concatenate((full_rows, candidates))
+        if len(rows) == self.rows:
+            return None
+        return np.sort(rows)
+
+    def _scan(self, ranges):
+        keep = np.ones(self.rows, dtype=bool)
+        for col, (low, high) in ranges.items():
+            values = self._values[col]
+            keep &= (values >= low) & (values <= high)
+        if keep.all():
+            return None
+        return np.flatnonzero(keep)